@@ -0,0 +1,120 @@
+"""
+Compares the old per-record replace_one loop on the cars snapshots against save_listings'
+batched bulk_write into listings, price_history and latest_listings.
+
+    uv run python benchmarks/bench_bulk_upsert.py --rows 2000
+    uv run python benchmarks/bench_bulk_upsert.py --rows 2000 --mongo-uri mongodb://localhost:27017/
+
+Without --mongo-uri it runs against mongomock; --latency-ms adds a simulated network
+round trip to every collection call so the difference in round trips shows up. mongomock runs
+through standin.BulkWriteDatabase, since mongomock 4.3 cannot take pymongo>=4.11 bulk operations.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(__file__))
+import standin  # noqa: E402
+from standin import main  # noqa: E402
+
+
+class LatencyCollection:
+    """Wraps a collection and sleeps before every write to emulate a network round trip."""
+    def __init__(self, collection, latency):
+        self.collection = collection
+        self.name = collection.name
+        self.latency = latency
+        self.calls = 0
+
+    def replace_one(self, *args, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.collection.replace_one(*args, **kwargs)
+
+    def bulk_write(self, *args, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.collection.bulk_write(*args, **kwargs)
+
+
+def make_listings(rows, search_term):
+    return pd.DataFrame([{
+        'unique_id': str(1000000 + i),
+        'image': f"https://http2.mlstatic.com/D_{i}.jpg",
+        'description': f"{search_term} listing {i}",
+        'price': f"US$ {20000 + i}",
+        'price_num': 20000 + i,
+        'currency': 'USD',
+        'year': '2018',
+        'year_num': 2018,
+        'kilometers': '50.000 Km',
+        'kilometers_num': 50000,
+        'location': 'Capital Federal',
+        'link': f"https://auto.mercadolibre.com.ar/MLA-{1000000 + i}-_JM",
+        'search_term': search_term,
+    } for i in range(rows)])
+
+
+def replace_one_loop(df, search_term, collection):
+    """The persistence loop scrape_mercado_libre used before bulk_write."""
+    records = df.to_dict(orient='records')
+    timestamp = datetime.utcnow()
+    today_str = timestamp.strftime('%Y-%m-%d')
+    for rec in records:
+        rec['timestamp'] = timestamp
+        rec['search_term'] = search_term
+        rec['date_str'] = today_str
+        filter_query = {
+            'unique_id': rec['unique_id'],
+            'search_term': search_term,
+            'date_str': today_str
+        }
+        collection.replace_one(filter_query, rec, upsert=True)
+
+
+def get_collection(mongo_uri, name):
+    if mongo_uri:
+        from pymongo import MongoClient
+        collection = MongoClient(mongo_uri)['ml_benchmarks'][name]
+    else:
+        collection = standin.BulkWriteDatabase('ml_benchmarks')[name]
+    collection.drop()
+    return collection
+
+
+def run(args):
+    df = make_listings(args.rows, 'benchmark')
+    latency = args.latency_ms / 1000.0
+
+    loop_collection = LatencyCollection(get_collection(args.mongo_uri, 'bench_replace_one'), latency)
+    start = time.perf_counter()
+    replace_one_loop(df, 'benchmark', loop_collection)
+    loop_seconds = time.perf_counter() - start
+
+    listings = LatencyCollection(get_collection(args.mongo_uri, 'bench_listings'), latency)
+    price_history = LatencyCollection(get_collection(args.mongo_uri, 'bench_price_history'), latency)
+    latest = LatencyCollection(get_collection(args.mongo_uri, 'bench_latest_listings'), latency)
+    start = time.perf_counter()
+    stats = main.save_listings(df, 'benchmark', listings=listings, price_history=price_history, latest=latest,
+                               batch_size=args.batch_size)
+    bulk_seconds = time.perf_counter() - start
+
+    print(f"rows={args.rows} batch_size={args.batch_size} latency_ms={args.latency_ms} "
+          f"backend={'mongod' if args.mongo_uri else 'mongomock'}")
+    print(f"replace_one loop: {loop_seconds:8.3f}s  {loop_collection.calls:6d} calls")
+    print(f"bulk_write:       {bulk_seconds:8.3f}s  {listings.calls + price_history.calls + latest.calls:6d} calls  "
+          f"upserted={sum(b['upserted'] for b in stats)}")
+    print(f"speedup:          {loop_seconds / bulk_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=main.mongo_bulk_batch_size)
+    parser.add_argument('--latency-ms', type=float, default=0.5)
+    parser.add_argument('--mongo-uri', default=None)
+    run(parser.parse_args())
@@ -0,0 +1,126 @@
+"""
+Shows that the streaming exports keep memory flat as the row count grows, against building
+the whole export in a DataFrame first.
+
+    uv run python benchmarks/bench_export.py --rows 1000000
+    uv run python benchmarks/bench_export.py --rows 1000000 --format parquet
+    uv run python benchmarks/bench_export.py --rows 1000000 --mongo-uri mongodb://localhost:27017/
+
+Without --mongo-uri the rows come from a generator shaped like the 'history' export cursor, so
+only the writer's own allocations are measured. With --mongo-uri the rows are loaded into a
+scratch database and exported through the real aggregation. Peak traced memory is printed
+for every --segment rows; a streaming writer stays flat from segment to segment. tracemalloc
+only sees Python allocations, so Arrow's buffers for Parquet are not counted; they are bounded
+by one chunk as well.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import main  # noqa: E402
+
+COLUMNS = main.EXPORT_DEFAULT_COLUMNS['history']
+
+
+def synthetic_rows(rows):
+    for i in range(rows):
+        yield {'unique_id': str(1000000 + i // 30), 'date_str': f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}",
+               'price_num': 20000 + i % 5000, 'description': f"listing {i // 30}"}
+
+
+def load_mongo(mongo_uri, rows):
+    """Fills a scratch database with rows // 30 listings of 30 daily prices each."""
+    from pymongo import MongoClient
+    db = MongoClient(mongo_uri)['ml_benchmarks']
+    latest, history = db['bench_export_latest'], db['bench_export_history']
+    latest.drop()
+    history.drop()
+    listings = max(1, rows // 30)
+    for start in range(0, listings, 10000):
+        ids = [str(1000000 + i) for i in range(start, min(start + 10000, listings))]
+        latest.insert_many([{'_id': uid, 'unique_id': uid, 'description': f"listing {uid}",
+                             'search_terms': ['benchmark']} for uid in ids])
+        history.insert_many([{'_id': uid, 'prices': {f"2026-{1 + d % 12:02d}-{1 + d:02d}": 20000 + d for d in range(30)}}
+                             for uid in ids])
+    main.latest_listings_collection, main.price_history_collection = latest, history
+    return latest
+
+
+def source(args):
+    if not args.mongo_uri:
+        return synthetic_rows(args.rows)
+    pipeline = main.export_pipeline('history', COLUMNS, 'benchmark')
+    return main.latest_listings_collection.aggregate(pipeline, allowDiskUse=True, batchSize=main.export_chunk_rows)
+
+
+def measured(rows, segment):
+    """Passes rows through, printing the traced peak of every segment."""
+    tracemalloc.reset_peak()
+    for count, row in enumerate(rows, start=1):
+        yield row
+        if count % segment == 0:
+            _, peak = tracemalloc.get_traced_memory()
+            print(f"  rows={count:>9}  peak={peak / 1024 / 1024:8.2f} MiB")
+            tracemalloc.reset_peak()
+
+
+def run_streaming(args):
+    start = time.perf_counter()
+    written = 0
+    if args.format == 'csv':
+        for chunk in main.iter_csv(measured(source(args), args.segment), COLUMNS):
+            written += len(chunk)
+    else:
+        with tempfile.TemporaryFile() as sink:
+            main.write_parquet(measured(source(args), args.segment), COLUMNS, main.EXPORT_COLUMNS['history'], sink)
+            written = sink.tell()
+    return time.perf_counter() - start, written
+
+
+def run_dataframe(args):
+    start = time.perf_counter()
+    tracemalloc.reset_peak()
+    df = pd.DataFrame(list(source(args)), columns=COLUMNS)
+    with tempfile.TemporaryFile() as sink:
+        if args.format == 'csv':
+            df.to_csv(sink, index=False)
+        else:
+            df.to_parquet(sink, index=False)
+        written = sink.tell()
+    _, peak = tracemalloc.get_traced_memory()
+    return time.perf_counter() - start, written, peak
+
+
+def run(args):
+    if args.format == 'parquet' and main.pa is None:
+        sys.exit("Parquet exports require pyarrow")
+    if args.mongo_uri:
+        load_mongo(args.mongo_uri, args.rows)
+    print(f"rows={args.rows} format={args.format} chunk_rows={main.export_chunk_rows} "
+          f"backend={'mongod' if args.mongo_uri else 'generator'}")
+
+    tracemalloc.start()
+    print("streaming export:")
+    seconds, written = run_streaming(args)
+    print(f"  {seconds:.2f}s  {written / 1024 / 1024:.1f} MiB written")
+    if not args.skip_dataframe:
+        seconds, written, peak = run_dataframe(args)
+        print(f"DataFrame export: {seconds:.2f}s  {written / 1024 / 1024:.1f} MiB written  "
+              f"peak={peak / 1024 / 1024:.2f} MiB")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--segment', type=int, default=100000)
+    parser.add_argument('--skip-dataframe', action='store_true', help="Only run the streaming export")
+    parser.add_argument('--mongo-uri', default=None)
+    run(parser.parse_args())
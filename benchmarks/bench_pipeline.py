@@ -0,0 +1,302 @@
+"""
+Times every stage of the scrape -> parse -> persist -> render path on its own, offline, for a
+few result sizes, and compares the run against a saved baseline to catch regressions.
+
+    uv run python benchmarks/bench_pipeline.py --output baseline.json
+    uv run python benchmarks/bench_pipeline.py --compare baseline.json
+    uv run python benchmarks/bench_pipeline.py --sizes 10000 --stages parse --profile profiles/
+    uv run python benchmarks/bench_pipeline.py --pages-from-cache http_cache.db --mongo-uri mongodb://localhost:27017/
+
+Stages:
+
+    fetch      GET every listing page from the local stand-in server through get_session()
+    parse      parse_results_page on every page, once per available parser backend
+    dataframe  pd.DataFrame over the parsed items
+    persist    save_listings into empty listings, price_history and latest_listings collections
+    variation  compute_price_variations on the freshly scraped frame (one latest_listings lookup)
+    render     render_results, the post-processing and template of the results page
+    serve      time to first byte of the results page (POST / with action=history) from the app
+               running on a local HTTP server, reading what persist stored; the entry also
+               records the compressed bytes sent
+
+Listing pages come from benchmarks/standin.py: generated by default, or saved pages with
+--pages-dir / --pages-from-cache. Mongo is mongomock, through standin.BulkWriteDatabase, unless
+--mongo-uri is given; mongomock's updates slow down with the collection size, so compare persist
+and variation numbers at 10k rows against a local mongod only.
+Every stage runs --repeat times after one warm-up run; the JSON results hold the min, median
+and mean seconds per stage and size. With --compare, a stage whose median is more than
+--threshold slower than the baseline (and by at least --min-delta-ms) is a regression and the
+script exits with status 1. --profile writes one cProfile file per stage and size.
+"""
+import argparse
+import cProfile
+import http.client
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlencode
+
+import pandas as pd
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(__file__))
+import standin  # noqa: E402
+from standin import main  # noqa: E402
+
+STAGES = ['fetch', 'parse', 'dataframe', 'persist', 'variation', 'render', 'serve']
+SEARCH_TERM = 'benchmark'
+
+
+class Pipeline:
+    """Data of one result size, carried from stage to stage; each stage reads what the previous one left."""
+    def __init__(self, args, rows, db):
+        self.args = args
+        self.rows = rows
+        self.db = db
+        self.pages = standin.listing_pages(rows, SEARCH_TERM, args.pages_dir, args.pages_from_cache, args.url_contains)
+        self.server = None
+        self.session = None
+        self.items = None
+        self.df = None
+        self.app_server = None
+        self.served_bytes = None
+        self.reset_collections()
+
+    def collections(self):
+        return self.db['bench_listings'], self.db['bench_price_history'], self.db['bench_latest_listings']
+
+    def reset_collections(self):
+        for collection in self.collections():
+            collection.drop()
+        main.listings_collection, main.price_history_collection, main.latest_listings_collection = self.collections()
+        main.search_term_registry.collection = self.db['bench_search_terms']
+        main.search_term_registry.invalidate()
+
+    def fetch(self):
+        urls = self.server.page_urls(SEARCH_TERM)
+        with ThreadPoolExecutor(max_workers=main.scraper_max_workers) as pool:
+            return list(pool.map(lambda url: self.session.get(url, timeout=10).text, urls))
+
+    def parse(self, backend):
+        items = []
+        for html in self.pages:
+            parsed = main.parse_results_page(html, SEARCH_TERM, backend=backend)
+            if parsed:
+                items.extend(parsed['items'])
+        return items
+
+    def dataframe(self):
+        return pd.DataFrame(self.items)
+
+    def persist(self):
+        # The last timed run leaves the collections filled, so later stages see a persisted scrape
+        listings, price_history, latest = self.collections()
+        return main.save_listings(self.df, SEARCH_TERM, listings=listings, price_history=price_history, latest=latest)
+
+    def variation(self):
+        return main.compute_price_variations(self.df)
+
+    def render(self):
+        with main.app.test_request_context('/', method='POST'):
+            return main.render_results(self.df, SEARCH_TERM, '1000', 'USD', [SEARCH_TERM])
+
+    def start_app_server(self):
+        if self.app_server is None:
+            if self.db['bench_latest_listings'].count_documents({}) == 0:
+                self.persist()
+            self.app_server = make_server('127.0.0.1', 0, main.app, threaded=True)
+            threading.Thread(target=self.app_server.serve_forever, daemon=True).start()
+
+    def stop_app_server(self):
+        if self.app_server is not None:
+            self.app_server.shutdown()
+            self.app_server = None
+
+    def serve(self):
+        """Returns the seconds from sending the request to receiving the response headers."""
+        body = urlencode({'action': 'history', 'search_term': SEARCH_TERM, 'exchange_rate': '1000', 'target_currency': 'USD'})
+        connection = http.client.HTTPConnection('127.0.0.1', self.app_server.server_port, timeout=300)
+        start = time.perf_counter()
+        connection.request('POST', '/', body=body, headers={
+            'Content-Type': 'application/x-www-form-urlencoded', 'Accept-Encoding': 'br, gzip'})
+        response = connection.getresponse()
+        ttfb = time.perf_counter() - start
+        self.served_bytes = len(response.read())
+        connection.close()
+        return ttfb
+
+
+def stage_runs(pipeline, stages):
+    """Yields (stage name, callable, setup) for the requested stages, in pipeline order."""
+    if 'fetch' in stages:
+        yield 'fetch', pipeline.fetch, None
+    for backend in main.PARSER_BACKENDS:
+        name = f"parse[{backend}]"
+        # The items of the configured backend feed the later stages
+        if 'parse' in stages or (backend == main.parser_backend and pipeline.items is None):
+            yield name, lambda backend=backend: pipeline.parse(backend), None
+    if 'dataframe' in stages:
+        yield 'dataframe', pipeline.dataframe, None
+    if 'persist' in stages:
+        yield 'persist', pipeline.persist, pipeline.reset_collections
+    if 'variation' in stages:
+        yield 'variation', pipeline.variation, None
+    if 'render' in stages:
+        yield 'render', pipeline.render, None
+    if 'serve' in stages:
+        yield 'serve', pipeline.serve, pipeline.start_app_server
+
+
+def measure(func, setup, repeat, profile_path=None, self_timed=False):
+    """
+    Runs func once to warm up, then repeat timed runs; setup runs untimed before each.
+    A self_timed func returns its own measurement in seconds instead of being timed whole.
+    """
+    if setup:
+        setup()
+    result = func()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        elapsed = func()
+        timings.append(elapsed if self_timed else time.perf_counter() - start)
+    if profile_path:
+        if setup:
+            setup()
+        profiler = cProfile.Profile()
+        profiler.runcall(func)
+        profiler.dump_stats(profile_path)
+    return result, timings
+
+
+def run_size(args, rows, db):
+    pipeline = Pipeline(args, rows, db)
+    pipeline.session = main.get_session(pool_size=max(10, main.scraper_max_workers))
+    results = []
+    with standin.StandInServer(pipeline.pages) as server:
+        pipeline.server = server
+        for name, func, setup in stage_runs(pipeline, args.stages):
+            # The app server answers serve on its own threads, out of the profiler's sight
+            profile_path = os.path.join(args.profile, f"{name}-{rows}.prof") if args.profile and name != 'serve' else None
+            result, timings = measure(func, setup, args.repeat, profile_path, self_timed=name == 'serve')
+            if name == f"parse[{main.parser_backend}]":
+                pipeline.items = result
+            elif name == 'dataframe':
+                pipeline.df = result
+            if pipeline.df is None and pipeline.items is not None and name.startswith('parse'):
+                pipeline.df = pd.DataFrame(pipeline.items)
+            entry = {
+                'stage': name,
+                'rows': rows,
+                'items': len(result) if name.startswith('parse') else len(pipeline.items) if pipeline.items is not None else None,
+                'pages': len(pipeline.pages),
+                'runs': len(timings),
+                'min_s': min(timings),
+                'median_s': statistics.median(timings),
+                'mean_s': statistics.fmean(timings),
+            }
+            if name == 'serve':
+                entry['bytes'] = pipeline.served_bytes
+            results.append(entry)
+            print(f"{rows:>7} rows  {name:<12} median {entry['median_s'] * 1000:10.2f} ms  "
+                  f"min {entry['min_s'] * 1000:10.2f} ms", file=sys.stderr)
+        pipeline.stop_app_server()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_database(mongo_uri):
+    if mongo_uri:
+        from pymongo import MongoClient
+        return MongoClient(mongo_uri)['ml_benchmarks']
+    return standin.BulkWriteDatabase('ml_benchmarks')
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Prints the change of every stage against the baseline; returns the regressed entries."""
+    previous = {(entry['stage'], entry['rows']): entry for entry in baseline['results']}
+    regressions = []
+    print(f"{'stage':<12} {'rows':>7} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for entry in results:
+        before = previous.get((entry['stage'], entry['rows']))
+        if before is None:
+            continue
+        change = entry['median_s'] / before['median_s'] - 1 if before['median_s'] else 0.0
+        regressed = change > threshold and entry['median_s'] - before['median_s'] > min_delta
+        if regressed:
+            regressions.append(entry)
+        print(f"{entry['stage']:<12} {entry['rows']:>7} {before['median_s'] * 1000:12.2f} "
+              f"{entry['median_s'] * 1000:12.2f} {change:+8.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def run(args):
+    # Fetches must reach the stand-in server, not the on-disk cache
+    main.http_cache = None
+    if args.profile:
+        os.makedirs(args.profile, exist_ok=True)
+    db = get_database(args.mongo_uri)
+
+    results = []
+    for rows in args.sizes:
+        results.extend(run_size(args, rows, db))
+
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mongo': 'mongod' if args.mongo_uri else 'mongomock',
+            'pages': 'generated' if not (args.pages_dir or args.pages_from_cache) else 'saved',
+            'parser_backend': main.parser_backend,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1000)
+        if regressions:
+            print(f"{len(regressions)} stage(s) regressed more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--pages-dir', default=None, help="Directory of saved listing pages (*.html)")
+    parser.add_argument('--pages-from-cache', default=None, help="Response cache database to take saved pages from")
+    parser.add_argument('--url-contains', default="", help="Only use cached pages whose URL contains this")
+    parser.add_argument('--mongo-uri', default=None)
+    parser.add_argument('--output', default=None, help="Write the JSON results here instead of stdout")
+    parser.add_argument('--compare', default=None, help="Baseline JSON results to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Relative slowdown that counts as a regression")
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help="Ignore slowdowns smaller than this")
+    parser.add_argument('--profile', default=None, help="Directory for per-stage cProfile output")
+    run(parser.parse_args())
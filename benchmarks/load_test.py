@@ -0,0 +1,162 @@
+"""
+Load test for a running server: requests per second and latency percentiles of the index page
+(GET /) and the price history endpoint (POST /history).
+
+    uv run python main.py serve &                              # single-process dev server
+    uv run python benchmarks/load_test.py --url http://127.0.0.1:52021 --concurrency 16 --duration 30
+
+    uv run --extra server gunicorn main:app &                  # gunicorn, gthread workers
+    uv run python benchmarks/load_test.py --url http://127.0.0.1:52021 --concurrency 16 --duration 30
+
+Every client thread keeps one HTTP/1.1 connection open and alternates between the endpoints
+given with --endpoints. /history is asked for listings taken from /export/results.csv, or the
+ids given with --unique-id. Use --output to keep the numbers as JSON.
+"""
+import argparse
+import csv
+import http.client
+import io
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+ENDPOINTS = ['index', 'history']
+
+
+class Client:
+    """One keep-alive connection; reconnects after errors or when the server closes it."""
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+        if response.getheader('Connection', '').lower() == 'close':
+            self.connection.close()
+            self.connection = None
+        return response.status, data
+
+
+def sample_unique_ids(url, limit=200):
+    status, data = Client(url).request('GET', '/export/results.csv?columns=unique_id')
+    if status != 200:
+        sys.exit(f"Could not list listings for /history: /export/results.csv answered {status}")
+    ids = [row['unique_id'] for row in csv.DictReader(io.StringIO(data.decode('utf-8')))]
+    if not ids:
+        sys.exit("No stored listings to ask /history for; scrape something first or pass --unique-id")
+    return random.sample(ids, min(limit, len(ids)))
+
+
+def call(client, endpoint, unique_ids):
+    if endpoint == 'index':
+        return client.request('GET', '/', headers={'Accept-Encoding': 'gzip'})
+    body = json.dumps({'unique_id': random.choice(unique_ids)})
+    return client.request('POST', '/history', body=body, headers={'Content-Type': 'application/json'})
+
+
+def worker(url, endpoints, unique_ids, deadline, samples, lock):
+    client = Client(url)
+    local = {endpoint: {'latencies': [], 'errors': 0} for endpoint in endpoints}
+    turn = 0
+    while time.monotonic() < deadline:
+        endpoint = endpoints[turn % len(endpoints)]
+        turn += 1
+        start = time.perf_counter()
+        try:
+            status, _ = call(client, endpoint, unique_ids)
+        except (OSError, http.client.HTTPException):
+            status = None
+        latency = time.perf_counter() - start
+        if status == 200:
+            local[endpoint]['latencies'].append(latency)
+        else:
+            local[endpoint]['errors'] += 1
+    with lock:
+        for endpoint, result in local.items():
+            samples[endpoint]['latencies'].extend(result['latencies'])
+            samples[endpoint]['errors'] += result['errors']
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(samples, duration):
+    summary = {}
+    for endpoint, result in samples.items():
+        latencies = result['latencies']
+        summary[endpoint] = {
+            'requests': len(latencies),
+            'errors': result['errors'],
+            'rps': round(len(latencies) / duration, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+        }
+    return summary
+
+
+def run(args):
+    unique_ids = args.unique_id or (sample_unique_ids(args.url) if 'history' in args.endpoints else [])
+    samples = {endpoint: {'latencies': [], 'errors': 0} for endpoint in args.endpoints}
+    lock = threading.Lock()
+
+    if args.warmup:
+        warmup_deadline = time.monotonic() + args.warmup
+        threads = [threading.Thread(target=worker, args=(args.url, args.endpoints, unique_ids, warmup_deadline,
+                                                         {e: {'latencies': [], 'errors': 0} for e in args.endpoints}, lock))
+                   for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    start = time.monotonic()
+    deadline = start + args.duration
+    threads = [threading.Thread(target=worker, args=(args.url, args.endpoints, unique_ids, deadline, samples, lock))
+               for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    summary = summarize(samples, elapsed)
+    print(f"url={args.url} concurrency={args.concurrency} duration={elapsed:.1f}s")
+    print(f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, row in summary.items():
+        print(f"{endpoint:<10} {row['requests']:>9} {row['errors']:>7} {row['rps']:>8} "
+              f"{row['p50_ms'] or 0:>9} {row['p95_ms'] or 0:>9} {row['p99_ms'] or 0:>9}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'concurrency': args.concurrency, 'duration_s': round(elapsed, 2),
+                       'endpoints': summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:52021')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=3, help="Seconds of untimed load before measuring")
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+    parser.add_argument('--unique-id', action='append', help="Listing to ask /history for (repeatable)")
+    parser.add_argument('--output', default=None)
+    run(parser.parse_args())
@@ -0,0 +1,245 @@
+"""
+Listing pages and a local HTTP stand-in for MercadoLibre, so benchmarks and load tests never
+touch the real site.
+
+Pages come from one of three sources:
+
+* generated: markup shaped like the current poly-card listing, with a card per listing,
+* a directory of saved .html listing pages (save them from the browser), or
+* the response cache (HTTP_CACHE_PATH) of earlier scrapes, through ResponseCache.iter_pages.
+
+Saved pages are repeated as often as needed to reach the requested row count; every copy gets
+its MLA ids rewritten so the listings stay unique.
+
+BulkWriteDatabase stands in for Mongo: mongomock collections whose bulk_write works on every
+pymongo version save_listings runs on.
+"""
+import glob
+import math
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.results import BulkWriteResult
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import main  # noqa: E402
+
+PRICES = [15000, 24500, 31000, 18000000, 27500000, 42000000]
+LOCATIONS = ['Capital Federal', 'Córdoba', 'Rosario', 'Mendoza', 'La Plata']
+
+
+def generated_card(i, search_term):
+    uid = 1000000 + i
+    price = f"{PRICES[i % len(PRICES)] + i * 10:,}".replace(',', '.')
+    km = f"{(i * 1375) % 250000:,}".replace(',', '.')
+    slug = search_term.replace(' ', '-')
+    return (
+        '<li class="ui-search-layout__item"><div class="poly-card poly-card--list andes-card andes-card--flat">'
+        '<div class="poly-card__portada">'
+        f'<img class="poly-component__picture" src="data:image/gif;base64,R0lGOD" '
+        f'data-src="https://http2.mlstatic.com/D_NQ_NP_{uid}-MLA-O.webp" alt="{search_term}"></div>'
+        '<div class="poly-card__content">'
+        f'<h3 class="poly-component__title-wrapper"><a class="poly-component__title" '
+        f'href="https://auto.mercadolibre.com.ar/MLA-{uid}-{slug}-_JM#position={i % 48 + 1}">'
+        f'{search_term.title()} {2010 + i % 14} listing {i}</a></h3>'
+        '<div class="poly-component__price"><span class="andes-money-amount">'
+        '<span class="andes-money-amount__currency-symbol">$</span>'
+        f'<span class="andes-money-amount__fraction">{price}</span></span></div>'
+        '<ul class="poly-attributes_list">'
+        f'<li class="poly-attributes_list__item poly-attributes_list__separator">{2010 + i % 14}</li>'
+        f'<li class="poly-attributes_list__item poly-attributes_list__separator">{km} Km</li></ul>'
+        f'<span class="poly-component__location">{LOCATIONS[i % len(LOCATIONS)]}</span>'
+        '</div></div></li>'
+    )
+
+
+def generated_page(offset, count, total, search_term, next_url=None):
+    """One listing page with count cards starting at listing number offset."""
+    cards = "".join(generated_card(offset + i, search_term) for i in range(count))
+    pagination = (f'<li class="andes-pagination__button andes-pagination__button--next">'
+                  f'<a href="{next_url}" title="Siguiente">Siguiente</a></li>') if next_url else ""
+    return (
+        '<!DOCTYPE html><html lang="es-AR"><head><meta charset="utf-8"><title>Listado</title></head><body>'
+        '<header class="nav-header"><a href="/">Mercado Libre</a></header>'
+        '<main><section class="ui-search-results">'
+        f'<span class="ui-search-search-result__quantity-results">{total:,} resultados</span>'.replace(',', '.')
+        + f'<ol class="ui-search-layout ui-search-layout--stack">{cards}</ol>'
+        f'<nav><ul class="andes-pagination">{pagination}</ul></nav>'
+        '</section></main></body></html>'
+    )
+
+
+def generated_pages(rows, search_term):
+    pages = math.ceil(rows / main.ITEMS_PER_PAGE)
+    return [generated_page(page * main.ITEMS_PER_PAGE, min(main.ITEMS_PER_PAGE, rows - page * main.ITEMS_PER_PAGE),
+                           rows, search_term) for page in range(pages)]
+
+
+def load_saved_pages(pages_dir=None, cache_path=None, url_contains=""):
+    """Saved listing pages from a directory of .html files or from a response cache database."""
+    if pages_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append(f.read())
+        return pages
+    cache = main.ResponseCache(cache_path, ttl=0, max_bytes=float('inf'), offline=True)
+    return [html for _, html in cache.iter_pages(url_contains)]
+
+
+def repeat_pages(pages, rows):
+    """Repeats saved pages until they hold about rows cards, rewriting the MLA ids of every copy."""
+    per_page = [len(re.findall(r"MLA-\d+", html)) or main.ITEMS_PER_PAGE for html in pages]
+    selected = []
+    cards = 0
+    copy = 0
+    while cards < rows:
+        for html, count in zip(pages, per_page):
+            if cards >= rows:
+                break
+            selected.append(html if copy == 0 else re.sub(r"MLA-(\d+)", lambda m: f"MLA-{m.group(1)}{copy:04d}", html))
+            cards += count
+        copy += 1
+    return selected
+
+
+def listing_pages(rows, search_term, pages_dir=None, cache_path=None, url_contains=""):
+    if not pages_dir and not cache_path:
+        return generated_pages(rows, search_term)
+    saved = load_saved_pages(pages_dir, cache_path, url_contains)
+    if not saved:
+        raise SystemExit("No saved listing pages found")
+    return repeat_pages(saved, rows)
+
+
+class StandInServer:
+    """
+    Serves a list of listing pages over HTTP on localhost. The page is picked from the
+    '_Desde_<offset>' pagination marker in the path, like the real listing URLs; offsets past
+    the last page get the "no results" page.
+    """
+    NO_RESULTS = ('<html><body><p class="ui-search-sidebar__no-results-message">'
+                  'No hay publicaciones que coincidan con tu búsqueda.</p></body></html>').encode('utf-8')
+
+    def __init__(self, pages, host='127.0.0.1', port=0):
+        self.pages = [page.encode('utf-8') for page in pages]
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests += 1
+                body = server.page_for(self.path)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def page_for(self, path):
+        match = re.search(r"_Desde_(\d+)", path)
+        index = (int(match.group(1)) - 1) // main.ITEMS_PER_PAGE if match else 0
+        return self.pages[index] if 0 <= index < len(self.pages) else self.NO_RESULTS
+
+    def page_urls(self, search_term):
+        first = main.build_search_url(search_term, base_url=self.base_url)
+        return [main.update_url_pagination(first, page) for page in range(1, len(self.pages) + 1)]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class BulkWriteCollection:
+    """
+    A mongomock collection whose bulk_write applies UpdateOne and ReplaceOne operations one at a
+    time. mongomock 4.3 hands bulk operations to pymongo's own _add_to_bulk, which passes a sort
+    argument its builder does not accept since pymongo 4.11.
+    """
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def bulk_write(self, requests, ordered=True):
+        result = {'nInserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'nUpserted': 0,
+                  'upserted': [], 'writeErrors': [], 'writeConcernErrors': []}
+        for index, request in enumerate(requests):
+            if isinstance(request, UpdateOne):
+                write = self.collection.update_one
+            elif isinstance(request, ReplaceOne):
+                write = self.collection.replace_one
+            else:
+                raise NotImplementedError(f"{type(request).__name__} is not supported by the stand-in")
+            try:
+                applied = write(request._filter, request._doc, upsert=bool(request._upsert))
+            except PyMongoError as e:
+                result['writeErrors'].append({'index': index, 'code': getattr(e, 'code', None), 'errmsg': str(e),
+                                              'op': request._doc})
+                if ordered:
+                    break
+                continue
+            if applied.upserted_id is not None:
+                result['nUpserted'] += 1
+                result['upserted'].append({'index': index, '_id': applied.upserted_id})
+            else:
+                result['nMatched'] += applied.matched_count
+                result['nModified'] += applied.modified_count
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+
+class BulkWriteDatabase:
+    """A mongomock database handing out BulkWriteCollection wrappers."""
+    def __init__(self, name):
+        import mongomock
+        self.database = mongomock.MongoClient()[name]
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def __getitem__(self, name):
+        return BulkWriteCollection(self.database[name])
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Serve listing pages on localhost until interrupted")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--search-term', default='benchmark')
+    parser.add_argument('--pages-dir', default=None)
+    parser.add_argument('--pages-from-cache', default=None)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    pages = listing_pages(args.rows, args.search_term, args.pages_dir, args.pages_from_cache, args.search_term.replace(' ', '-'))
+    with StandInServer(pages, port=args.port) as server:
+        print(f"Serving {len(pages)} pages at {server.base_url}; scrape with ML_BASE_URL={server.base_url}")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
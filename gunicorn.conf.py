@@ -0,0 +1,61 @@
+"""
+gunicorn settings for serving the app with several worker processes:
+
+    uv run --extra server gunicorn main:app
+
+gunicorn reads this file from the working directory. Every setting can be overridden on the
+command line or through the environment variables below.
+"""
+import importlib.util
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', 52021)}"
+# gthread: each process serves requests from a thread pool, so slow requests (synchronous
+# scrapes, SSE log streams) do not block a whole process
+worker_class = 'gthread'
+workers = int(os.getenv("WEB_CONCURRENCY", min(multiprocessing.cpu_count(), 4)))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+# A synchronous "Scrapear" POST can run for minutes
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 300))
+graceful_timeout = 30
+keepalive = 5
+# Importing the app once in the master shares its memory and compiled templates with the workers;
+# post_worker_init rebuilds what a forked process must not share
+preload_app = os.getenv("GUNICORN_PRELOAD", "True").lower() == "true"
+# "-" logs requests to stdout; empty disables the access log
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+
+# Result frames are shared through this directory, so any worker can page a result another
+# worker produced; set before the app is imported so every worker sees the same one
+created_results_dir = None
+if not os.getenv("RESULTS_CACHE_DIR"):
+    created_results_dir = os.environ["RESULTS_CACHE_DIR"] = tempfile.mkdtemp(prefix='ml-results-')
+
+# Each worker writes its Prometheus metrics to files in this directory and /metrics adds them up;
+# it must be set before prometheus_client is imported
+created_metrics_dir = None
+metrics_enabled = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+if metrics_enabled and not os.getenv("PROMETHEUS_MULTIPROC_DIR") and importlib.util.find_spec('prometheus_client'):
+    created_metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix='ml-metrics-')
+
+
+def post_worker_init(worker):
+    # Runs in every worker once the app is loaded, whether it was imported before or after the fork
+    sys.modules['main'].reinit_after_fork(worker.cfg.workers)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR") and importlib.util.find_spec('prometheus_client'):
+        from prometheus_client import multiprocess
+        # Drops the live gauges of the dead worker; its counters and histograms keep counting
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    for directory in (created_results_dir, created_metrics_dir):
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -1,20 +1,67 @@
-from flask import Flask, render_template_string, request, send_file, jsonify
+from flask import Flask, render_template, request, jsonify, Response, url_for
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import pandas as pd
+import numpy as np
 import time
+import math
+import asyncio
+import threading
+import contextvars
+import csv
+import gzip
+import tempfile
+import functools
+import hashlib
+import json
+import sqlite3
+import zlib
 import logging
 from io import StringIO
 import sys
-from pymongo import MongoClient
-from datetime import datetime
+import pymongo
+from pymongo import MongoClient, ReplaceOne, UpdateOne, IndexModel, ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import re
 import os
+import argparse
+import uuid
 from urllib.parse import quote_plus, urlparse
 from dotenv import load_dotenv
 
+try:
+    import httpx  # Optional: enables the asyncio engine for "Scrapear Todos"
+except ImportError:
+    httpx = None
+
+try:
+    from lxml import etree, html as lxml_html  # Optional: fast compiled parser backend
+except ImportError:
+    etree = lxml_html = None
+
+try:
+    import brotli  # Optional: brotli response compression, preferred over gzip when the client accepts it
+except ImportError:
+    brotli = None
+
+try:
+    import prometheus_client  # Optional: /metrics endpoint
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+except ImportError:
+    prometheus_client = None
+
+try:
+    import pyarrow as pa  # Optional: Parquet exports
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
 app = Flask(__name__)
@@ -23,21 +70,263 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 debug = os.getenv("DEBUG", "False").lower() == "true"
 port = os.getenv("PORT", 52021)
-
+# Response compression: smallest body worth compressing and the gzip/brotli levels
+response_compression = os.getenv("RESPONSE_COMPRESSION", "True").lower() == "true"
+response_compression_min_bytes = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", 1024))
+response_gzip_level = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
+response_brotli_quality = int(os.getenv("RESPONSE_BROTLI_QUALITY", 5))
+# Seconds browsers may reuse static files (the page scripts) before revalidating them
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.getenv("STATIC_MAX_AGE", 3600))
+# Log lines kept per request/job for the UI, and the lowest level recorded
+web_log_maxlen = int(os.getenv("WEB_LOG_MAXLEN", 2000))
+web_log_level = os.getenv("WEB_LOG_LEVEL", "DEBUG" if debug else "INFO").upper()
+
+ITEMS_PER_PAGE = 48
+# Scraper tuning: concurrent pagination, worker pool size and per-host request rate
+scraper_concurrent = os.getenv("SCRAPER_CONCURRENT", "True").lower() == "true"
+scraper_max_workers = int(os.getenv("SCRAPER_MAX_WORKERS", 4))
+scraper_requests_per_second = float(os.getenv("SCRAPER_REQUESTS_PER_SECOND", 2))
+# Bounds and burst of the adaptive per-host token bucket, latency above which it slows down,
+# and how many times a 429/403 page is retried after the limiter's pause
+scraper_min_requests_per_second = float(os.getenv("SCRAPER_MIN_REQUESTS_PER_SECOND", 0.2))
+scraper_max_requests_per_second = float(os.getenv("SCRAPER_MAX_REQUESTS_PER_SECOND", 8))
+scraper_burst = float(os.getenv("SCRAPER_BURST", 2))
+scraper_target_latency = float(os.getenv("SCRAPER_TARGET_LATENCY", 2.0))
+scraper_throttle_retries = int(os.getenv("SCRAPER_THROTTLE_RETRIES", 3))
+scraper_max_pages = int(os.getenv("SCRAPER_MAX_PAGES", 42))
+# Global cap on in-flight requests for the asyncio "Scrapear Todos" engine
+scraper_async_concurrency = int(os.getenv("SCRAPER_ASYNC_CONCURRENCY", 8))
+ml_base_url = os.getenv("ML_BASE_URL", "https://listado.mercadolibre.com.ar/")
+# Incremental mode: newest listings first, stop after N pages without new or changed listings
+scraper_incremental = os.getenv("SCRAPER_INCREMENTAL", "False").lower() == "true"
+scraper_incremental_order = os.getenv("SCRAPER_INCREMENTAL_ORDER", "_OrderId_BEGINS*DESC")
+scraper_incremental_stop_pages = int(os.getenv("SCRAPER_INCREMENTAL_STOP_PAGES", 2))
+# On-disk response cache (SQLite file, disabled when empty); offline mode never touches the network
+http_cache_path = os.getenv("HTTP_CACHE_PATH", "")
+http_cache_ttl = int(os.getenv("HTTP_CACHE_TTL", 86400))
+http_cache_max_mb = int(os.getenv("HTTP_CACHE_MAX_MB", 200))
+http_cache_offline = os.getenv("HTTP_CACHE_OFFLINE", "False").lower() == "true"
+# Number of listings written per bulk_write batch
+mongo_bulk_batch_size = int(os.getenv("MONGO_BULK_BATCH_SIZE", 500))
+# Processed result frames kept in memory for the paginated /api/results endpoint
+results_cache_size = int(os.getenv("RESULTS_CACHE_SIZE", 20))
+results_cache_ttl = int(os.getenv("RESULTS_CACHE_TTL", 3600))
+# /api/stats responses kept per (result, filters), and the most points sent for the scatter plot
+stats_cache_size = int(os.getenv("STATS_CACHE_SIZE", 128))
+stats_scatter_max_points = int(os.getenv("STATS_SCATTER_MAX_POINTS", 1000))
+# Rows fetched from the cursor and written per chunk by the streaming exports
+export_chunk_rows = int(os.getenv("EXPORT_CHUNK_ROWS", 5000))
+# Background scrape jobs: worker threads and how many jobs are remembered for polling
+scrape_job_workers = int(os.getenv("SCRAPE_JOB_WORKERS", 2))
+scrape_job_history = int(os.getenv("SCRAPE_JOB_HISTORY", 50))
+# Seconds job snapshots are kept in Mongo for workers that did not run the job
+scrape_job_snapshot_ttl = int(os.getenv("SCRAPE_JOB_SNAPSHOT_TTL", 86400))
+# Directory where result frames are shared between worker processes (empty keeps them in memory only)
+results_cache_dir = os.getenv("RESULTS_CACHE_DIR", "")
+# Seconds the search term list is cached in-process before re-reading the registry
+search_terms_cache_ttl = int(os.getenv("SEARCH_TERMS_CACHE_TTL", 60))
+# Most listings a single /history/batch request may ask for
+history_batch_max = int(os.getenv("HISTORY_BATCH_MAX", 500))
+# Prometheus metrics at /metrics; off when disabled here or when prometheus_client is not installed
+metrics_enabled = os.getenv("METRICS_ENABLED", "True").lower() == "true" and prometheus_client is not None
+
+
+class LogBuffer:
+    """
+    Fixed-capacity ring buffer of log lines. Every line gets a sequence number so a reader can
+    tail the buffer from the last line it saw.
+    """
+    def __init__(self, maxlen):
+        self._lines = deque(maxlen=maxlen)
+        self._seq = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def append(self, line):
+        with self._cond:
+            self._seq += 1
+            self._lines.append((self._seq, line))
+            self._cond.notify_all()
+
+    def since(self, seq):
+        with self._cond:
+            return [(line_seq, line) for line_seq, line in self._lines if line_seq > seq]
+
+    def wait(self, seq, timeout):
+        """Blocks until there are lines after seq or the buffer is closed; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._seq > seq or self._closed, timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def lines(self):
+        with self._cond:
+            return [line for _, line in self._lines]
 
 class WebLogger:
-    def __init__(self):
-        self.logs = []
-    def write(self, message):
+    """
+    Collects the application log lines shown in the web UI.
+    Lines go to the LogBuffer bound to the current request or job, or to a shared fallback
+    buffer outside of one. Lines below the configured level are dropped before formatting.
+    """
+    def __init__(self, maxlen, level):
+        self.maxlen = maxlen
+        self.level = level
+        self._fallback = LogBuffer(maxlen)
+        self._current = contextvars.ContextVar('web_log_buffer', default=None)
+
+    def new_buffer(self):
+        return LogBuffer(self.maxlen)
+
+    def bind(self, buffer):
+        """Routes the lines written from the current context (and tasks it spawns) to buffer."""
+        self._current.set(buffer)
+        return buffer
+
+    @property
+    def buffer(self):
+        return self._current.get() or self._fallback
+
+    @property
+    def logs(self):
+        return self.buffer.lines
+
+    @property
+    def debug_enabled(self):
+        return self.level <= logging.DEBUG
+
+    def write(self, message, level=logging.INFO):
+        if level < self.level:
+            return
         if message.strip():
-            self.logs.append(message.strip())
+            self.buffer.append(message.strip())
+
+    def debug(self, message, *args):
+        if self.level <= logging.DEBUG:
+            self.write(message % args if args else message, logging.DEBUG)
+
     def flush(self):
         pass
 
-web_logger = WebLogger()
-# Redirect stdout to web_logger to capture legacy print statements or 3rd party logs,
-# although we prefer using web_logger.write() explicitly for application logging.
-sys.stdout = web_logger
+web_logger = WebLogger(web_log_maxlen, logging.getLevelNamesMapping().get(web_log_level, logging.INFO))
+
+
+class NullMetric:
+    """Stands in for every metric while metrics are disabled: labels() returns itself and updates do nothing."""
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+class ScraperMetrics:
+    """
+    Prometheus histograms and counters for the scrape, storage and render hot paths.
+    When disabled every metric is a NullMetric, so instrumented code only pays for a no-op call.
+    Under gunicorn, PROMETHEUS_MULTIPROC_DIR makes /metrics add up every worker process.
+    """
+    NAMES = ['page_fetch_seconds', 'page_parse_seconds', 'page_items', 'mongo_command_seconds',
+             'mongo_command_failures', 'template_render_seconds', 'pages_not_found', 'empty_pages',
+             'selector_fallbacks', 'item_parse_errors']
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        if not enabled:
+            for name in self.NAMES:
+                setattr(self, name, NullMetric())
+            return
+        Histogram, Counter = prometheus_client.Histogram, prometheus_client.Counter
+        self.page_fetch_seconds = Histogram(
+            'ml_page_fetch_seconds', 'Seconds to fetch one listing page', ['source'],
+            buckets=(0.005, 0.025, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15))
+        self.page_parse_seconds = Histogram(
+            'ml_page_parse_seconds', 'Seconds to parse one listing page', ['backend'],
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+        self.page_items = Histogram(
+            'ml_page_items', 'Listings parsed from one listing page', buckets=(0, 1, 12, 24, 36, 47, 48, 60))
+        self.mongo_command_seconds = Histogram(
+            'ml_mongo_command_seconds', 'Seconds MongoDB took to answer a command (find_one runs find, '
+            'replace_one and bulk updates run update)', ['command'],
+            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+        self.mongo_command_failures = Counter(
+            'ml_mongo_command_failures_total', 'MongoDB commands that returned an error', ['command'])
+        self.template_render_seconds = Histogram(
+            'ml_template_render_seconds', 'Seconds to render a page template', ['template'],
+            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+        self.pages_not_found = Counter('ml_pages_not_found_total', 'Listing pages answered with 404')
+        self.empty_pages = Counter(
+            'ml_empty_pages_total', 'Listing pages with a no-results message or without cards', ['reason'])
+        self.selector_fallbacks = Counter(
+            'ml_selector_fallbacks_total', "Listing pages parsed through the 'poly-card' fallback selector", ['backend'])
+        self.item_parse_errors = Counter('ml_item_parse_errors_total', 'Listing cards that failed to parse')
+
+    def exposition(self):
+        """The text exposition format of every metric, with the rate limiter's current state."""
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            from prometheus_client import multiprocess
+            registry = prometheus_client.CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            # The limiter lives in each worker; this is the one of the worker answering
+            registry.register(RateLimiterCollector())
+            return prometheus_client.generate_latest(registry)
+        return prometheus_client.generate_latest()
+
+
+class RateLimiterCollector:
+    """Exposes AdaptiveRateLimiter.metrics() per host when /metrics is scraped."""
+    @staticmethod
+    def families():
+        return {
+            'rate': GaugeMetricFamily('ml_rate_limiter_rate', 'Current requests per second allowed', labels=['host']),
+            'latency': GaugeMetricFamily('ml_rate_limiter_latency_seconds', 'Smoothed response latency', labels=['host']),
+            'error_rate': GaugeMetricFamily('ml_rate_limiter_error_rate', 'Smoothed share of failed requests', labels=['host']),
+            'blocked_for': GaugeMetricFamily('ml_rate_limiter_blocked_seconds', 'Seconds left of a throttling pause', labels=['host']),
+            'requests': CounterMetricFamily('ml_rate_limiter_requests', 'Requests that took a token', labels=['host']),
+            'throttled': CounterMetricFamily('ml_rate_limiter_throttled', 'Responses with 403 or 429', labels=['host']),
+            'waited_seconds': CounterMetricFamily('ml_rate_limiter_waited_seconds', 'Seconds spent waiting for tokens', labels=['host']),
+        }
+
+    def describe(self):
+        # Lets the registry check names without reading the limiter, which may not exist yet
+        return list(self.families().values())
+
+    def collect(self):
+        families = self.families()
+        for host, state in rate_limiter.metrics().items():
+            for key, family in families.items():
+                if state[key] is not None:
+                    family.add_metric([host], state[key])
+        return list(families.values())
+
+
+class MongoCommandMetrics(pymongo.monitoring.CommandListener):
+    """Feeds the duration of every MongoDB command into metrics.mongo_command_seconds."""
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics.mongo_command_seconds.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        metrics.mongo_command_seconds.labels(event.command_name).observe(event.duration_micros / 1e6)
+        metrics.mongo_command_failures.labels(event.command_name).inc()
+
+
+metrics = ScraperMetrics(metrics_enabled)
+if metrics_enabled and not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    prometheus_client.REGISTRY.register(RateLimiterCollector())
 
 mongo_user = os.getenv("MONGO_USER")
 mongo_password = os.getenv("MONGO_PASSWORD")
@@ -45,6 +334,19 @@ mongo_host = os.getenv("MONGO_HOST", "localhost")
 mongo_port = os.getenv("MONGO_PORT", "27017")
 mongo_db_name = os.getenv("MONGO_DB", "ml")
 mongo_auth_source = os.getenv("MONGO_AUTH_SOURCE", "admin")
+mongo_ensure_indexes = os.getenv("MONGO_ENSURE_INDEXES", "True").lower() == "true"
+# Connection pool of every worker process; minPoolSize connections are kept warm once connected
+mongo_max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+mongo_min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+# Idle pooled connections are closed after this many milliseconds; 0 keeps them open
+mongo_max_idle_time_ms = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "0"))
+# Wire compression, in order of preference (e.g. "zstd,snappy,zlib"); zstd and snappy need extra packages
+mongo_compressors = os.getenv("MONGO_COMPRESSORS", "")
+mongo_server_selection_timeout_ms = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000"))
+mongo_connect_timeout_ms = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "20000"))
+# Seconds between background pings reported by /healthz (0 disables them) and the timeout of each ping
+mongo_health_interval = float(os.getenv("MONGO_HEALTH_INTERVAL", "30"))
+mongo_health_timeout = float(os.getenv("MONGO_HEALTH_TIMEOUT", "2"))
 
 constructed_uri = None
 if mongo_user and mongo_password:
@@ -65,50 +367,243 @@ else:
     final_mongo_uri = f"mongodb://{mongo_host}:{mongo_port}/"
     logger.info("Configuration: Using default localhost URI.")
 
-def diagnose_mongo_connection(uri):
+def mongo_client_options():
+    """Pool, timeout and compression settings for MongoClient, from the environment."""
+    options = {
+        'maxPoolSize': mongo_max_pool_size,
+        'minPoolSize': mongo_min_pool_size,
+        'serverSelectionTimeoutMS': mongo_server_selection_timeout_ms,
+        'connectTimeoutMS': mongo_connect_timeout_ms,
+    }
+    if mongo_max_idle_time_ms:
+        options['maxIdleTimeMS'] = mongo_max_idle_time_ms
+    if mongo_compressors:
+        options['compressors'] = mongo_compressors
+    if metrics.enabled:
+        options['event_listeners'] = [MongoCommandMetrics()]
+    return options
+
+def create_mongo_client(uri=None):
     """
-    Diagnoses MongoDB connection issues by attempting a ping and logging details.
+    Creates the MongoClient without connecting: connect=False defers server discovery and the
+    first pooled connection to the first operation, so importing the app never waits on Mongo.
     """
-    masked_uri_log = re.sub(r':([^@]+)@', ':****@', uri)
-    logger.info(f"Diagnostic: Attempting connection to: {masked_uri_log}")
+    return MongoClient(uri or final_mongo_uri, connect=False, **mongo_client_options())
 
+def diagnose_mongo_error(error):
+    """Logs the hints that help tell a network problem from an authentication one."""
+    masked_uri_log = re.sub(r':([^@]+)@', ':****@', final_mongo_uri)
     # Check what variables are present (keys only for security)
     env_vars = {
         key: bool(os.getenv(key))
         for key in ["MONGO_URI", "MONGO_USER", "MONGO_PASSWORD", "MONGO_HOST", "MONGO_PORT", "MONGO_DB", "MONGO_AUTH_SOURCE"]
     }
-    logger.info(f"Diagnostic: Environment Variables Presence: {env_vars}")
+    logger.error(f"Diagnostic: MongoDB health check against {masked_uri_log} FAILED.")
+    logger.error(f"Diagnostic: Environment Variables Presence: {env_vars}")
+    logger.error(f"Error Type: {type(error).__name__}")
+    logger.error(f"Error Details: {error}")
+    # Log authentication specific details if possible
+    if "Authentication failed" in str(error) or "requires authentication" in str(error):
+        logger.error("Diagnostic: This is an AUTHENTICATION error. Check username, password, and authSource.")
+        if not os.getenv("MONGO_AUTH_SOURCE"):
+            logger.error("Diagnostic: MONGO_AUTH_SOURCE is not set. Defaulting to 'admin'. Try setting it to your database name.")
+
+class MongoHealthCheck:
+    """
+    Pings MongoDB from a background thread every interval seconds and keeps the outcome for
+    /healthz. The full diagnostics are logged when the check starts failing, not on every failure.
+    """
+    def __init__(self, client, interval, timeout):
+        self.client = client
+        self.interval = interval
+        self.timeout = timeout
+        self.status = 'unknown'
+        self.latency_ms = None
+        self.error = None
+        self.checked_at = None
+        self.last_ok_at = None
+        self.consecutive_failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        started = time.perf_counter()
+        try:
+            # Bounds the ping by timeout even when server selection would wait longer
+            with pymongo.timeout(self.timeout):
+                self.client.admin.command('ping')
+        except Exception as e:
+            with self._lock:
+                failing = self.status != 'down'
+                self.status = 'down'
+                self.latency_ms = None
+                self.error = f"{type(e).__name__}: {e}"
+                self.checked_at = datetime.utcnow()
+                self.consecutive_failures += 1
+            if failing:
+                diagnose_mongo_error(e)
+            return False
+        latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        with self._lock:
+            if self.status == 'down':
+                logger.info(f"MongoDB is reachable again after {self.consecutive_failures} failed checks.")
+            self.status = 'ok'
+            self.latency_ms = latency_ms
+            self.error = None
+            self.checked_at = self.last_ok_at = datetime.utcnow()
+            self.consecutive_failures = 0
+        return True
+
+    def start(self):
+        def run():
+            while not self._stop.is_set():
+                self.check()
+                self._stop.wait(self.interval)
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name='mongo-health', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stale(self):
+        """Whether the last outcome is too old to report: always without background checks."""
+        if self.interval <= 0 or self.checked_at is None:
+            return True
+        # A background ping is due every interval and may take up to timeout to come back
+        return (datetime.utcnow() - self.checked_at).total_seconds() > self.interval + self.timeout
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'status': self.status,
+                'latency_ms': self.latency_ms,
+                'error': self.error,
+                'checked_at': self.checked_at.isoformat() if self.checked_at else None,
+                'last_ok_at': self.last_ok_at.isoformat() if self.last_ok_at else None,
+                'consecutive_failures': self.consecutive_failures,
+            }
 
-    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
-    try:
-        # Try a simple administrative command to verify connectivity and auth
-        info = client.server_info()
-        logger.info("Diagnostic: Connection Successful. Server Info available.")
-        logger.debug(f"Server Info: {info}")
-        return client
-    except Exception as e:
-        logger.error("Diagnostic: Connection FAILED.")
-        logger.error(f"Error Type: {type(e).__name__}")
-        logger.error(f"Error Details: {e}")
-        # Log authentication specific details if possible
-        if "Authentication failed" in str(e) or "requires authentication" in str(e):
-             logger.error("Diagnostic: This is an AUTHENTICATION error. Check username, password, and authSource.")
-             if not os.getenv("MONGO_AUTH_SOURCE"):
-                 logger.error("Diagnostic: MONGO_AUTH_SOURCE is not set. Defaulting to 'admin'. Try setting it to your database name.")
-        raise e
-
-# Perform diagnosis
-try:
-    mongo_client = diagnose_mongo_connection(final_mongo_uri)
-except Exception as e:
-    logger.critical("Failed to connect to MongoDB during startup diagnostics. Application might crash on first request.")
-    # We allow the app to continue so the logs are flushed/visible, but the client might be in a bad state.
-    mongo_client = MongoClient(final_mongo_uri)
+mongo_client = create_mongo_client()
+mongo_health = MongoHealthCheck(mongo_client, mongo_health_interval, mongo_health_timeout)
 
 mongo_db = mongo_client[mongo_db_name]
+# Legacy full-document daily snapshots; only read by the migrate-storage command
 cars_collection = mongo_db[os.getenv("MONGO_COLLECTION", "cars")]
+# Static attributes of every listing, keyed by unique_id, with the search terms it was found under
+listings_collection = mongo_db[os.getenv("MONGO_LISTINGS_COLLECTION", "listings")]
+# One document per listing: {'prices': {date_str: price_num}}
+price_history_collection = mongo_db[os.getenv("MONGO_PRICE_HISTORY_COLLECTION", "price_history")]
+# Materialized view: each listing's attributes with its latest and previous price, kept current by save_listings
+latest_listings_collection = mongo_db[os.getenv("MONGO_LATEST_LISTINGS_COLLECTION", "latest_listings")]
+# Registry of scraped search terms with per-term metadata; feeds the "Búsquedas anteriores" dropdown
+search_terms_collection = mongo_db[os.getenv("MONGO_SEARCH_TERMS_COLLECTION", "search_terms")]
+scrape_runs_collection = mongo_db[os.getenv("MONGO_SCRAPE_RUNS_COLLECTION", "scrape_runs")]
+# Last known state of every background scrape job, read by workers other than the one running it
+scrape_jobs_collection = mongo_db[os.getenv("MONGO_SCRAPE_JOBS_COLLECTION", "scrape_jobs")]
+# Collection globals that reinit_after_fork points at a new client
+MONGO_COLLECTION_GLOBALS = ['cars_collection', 'listings_collection', 'price_history_collection',
+                            'latest_listings_collection', 'search_terms_collection', 'scrape_runs_collection',
+                            'scrape_jobs_collection']
+
+# Indexes backing every query path, per collection; listings and price_history are only read by _id
+COLLECTION_INDEXES = {
+    latest_listings_collection.name: [
+        # Listings of a term in get_historical_data, and the distinct search term list
+        IndexModel([('search_terms', ASCENDING)], name='search_terms'),
+    ],
+    scrape_jobs_collection.name: [
+        IndexModel([('created_at', ASCENDING)], name='created_at_ttl', expireAfterSeconds=scrape_job_snapshot_ttl),
+    ],
+}
+
+def ensure_indexes(db=None):
+    """
+    Creates the indexes the query paths need. Safe to run on every startup.
+    """
+    db = mongo_db if db is None else db
+    for name, indexes in COLLECTION_INDEXES.items():
+        db[name].create_indexes(indexes)
+        logger.info(f"Indexes ensured on {name}.")
+
+def ensure_indexes_in_background():
+    # Index builds must not hold up startup, and Mongo may still be unreachable here
+    def run():
+        try:
+            ensure_indexes()
+        except Exception as e:
+            logger.error(f"Could not ensure MongoDB indexes: {e}")
+    threading.Thread(target=run, name='ensure-indexes', daemon=True).start()
+
+def start_background_tasks():
+    """
+    Starts the MongoDB health check and the startup index build in the process that serves
+    requests: main() for the development server, reinit_after_fork in every gunicorn worker.
+    Importing the module starts nothing, so a preloading gunicorn master holds no threads or
+    live connections for its workers to inherit.
+    """
+    if mongo_health_interval > 0:
+        mongo_health.start()
+    if mongo_ensure_indexes:
+        ensure_indexes_in_background()
 
-def update_url_pagination(current_url, page_number, items_per_page=48):
+class SearchTermRegistry:
+    """
+    Small collection with one document per scraped search term, so the dropdown reads O(terms)
+    documents instead of scanning listings. The term list is cached in-process, dropped on every
+    write made by this process and re-read after ttl seconds to pick up other processes' writes.
+    """
+    def __init__(self, collection, ttl):
+        self.collection = collection
+        self.ttl = ttl
+        self._cache = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._cache = None
+
+    def entries(self):
+        """Every registered term with its metadata, sorted by term."""
+        with self._lock:
+            if self._cache is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._cache
+        entries = list(self.collection.find({}).sort('_id', ASCENDING))
+        if not entries:
+            # Data stored before the registry existed; the distinct is served by the search_terms index
+            self.backfill()
+            entries = list(self.collection.find({}).sort('_id', ASCENDING))
+        with self._lock:
+            self._cache, self._loaded_at = entries, time.monotonic()
+        return entries
+
+    def terms(self):
+        return [entry['_id'] for entry in self.entries()]
+
+    def record_scrape(self, search_term, listing_count, duration):
+        # A term is only registered once it returned listings, as when the dropdown came from the stored data
+        self.collection.update_one({'_id': search_term}, {
+            '$set': {'last_scraped_at': datetime.utcnow(), 'listing_count': listing_count,
+                     'last_duration_seconds': round(duration, 1)},
+            '$inc': {'scrape_count': 1},
+        }, upsert=listing_count > 0)
+        self.invalidate()
+
+    def backfill(self):
+        """Registers the terms found in latest_listings that are not in the registry yet."""
+        terms = [term for term in latest_listings_collection.distinct('search_terms') if term]
+        if terms:
+            self.collection.bulk_write([
+                UpdateOne({'_id': term}, {'$setOnInsert': {'scrape_count': 0}}, upsert=True) for term in terms
+            ], ordered=False)
+        self.invalidate()
+        return len(terms)
+
+search_term_registry = SearchTermRegistry(search_terms_collection, search_terms_cache_ttl)
+
+def update_url_pagination(current_url, page_number, items_per_page=ITEMS_PER_PAGE):
     """
     Updates the '_Desde_' parameter in the URL for pagination.
     If '_Desde_' is missing, it appends it.
@@ -179,7 +674,211 @@ def determine_currency_and_format(price_num):
 
     return currency, price_formatted
 
-def get_session():
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
+    'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+    'Sec-Ch-Ua-Mobile': '?0',
+    'Sec-Ch-Ua-Platform': '"Windows"',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+def convert_prices(price_num, exchange_rate_val, target_currency):
+    """
+    Column-wise currency detection, conversion and formatting for a whole price column.
+    Applies the same rules as determine_currency_and_format: prices above 1,000,000 are ARS,
+    the rest USD, and zero means unknown ('N/A').
+    Returns (currency, formatted price, normalized price) arrays aligned with price_num.
+    """
+    prices = price_num.to_numpy(dtype=float)
+    source_currency = np.select([prices == 0, prices > 1000000], ['N/A', 'ARS'], default='USD')
+
+    final_prices = prices
+    final_currency = source_currency
+    if exchange_rate_val > 0:
+        if target_currency == 'USD':
+            convert = source_currency == 'ARS'
+            final_prices = np.where(convert, prices / exchange_rate_val, prices)
+            final_currency = np.where(convert, 'USD', source_currency)
+        elif target_currency == 'ARS':
+            convert = source_currency == 'USD'
+            final_prices = np.where(convert, prices * exchange_rate_val, prices)
+            final_currency = np.where(convert, 'ARS', source_currency)
+
+    # Format with dots for thousands: 15000000 -> 15.000.000
+    # astype(str): map() leaves an empty column as float, which has no .str accessor
+    formatted_num = pd.Series(final_prices, dtype=float).map('{:,.0f}'.format).astype(str).str.replace(',', '.').to_numpy()
+    prefix = np.where(final_currency == 'ARS', '$ ', 'US$ ')
+    return final_currency.astype(object), (prefix + formatted_num).astype(object), final_prices
+
+class OfflineCacheMiss(requests.ConnectionError):
+    """Raised in offline mode when a URL is not in the response cache."""
+
+class ResponseCache:
+    """
+    SQLite store of zlib-compressed HTTP responses keyed by the SHA-256 of the URL.
+    Entries older than ttl seconds are misses (offline mode serves them anyway) and the least
+    recently used entries are evicted once the compressed bodies exceed max_bytes.
+    """
+    SKIPPED_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'set-cookie'}
+
+    def __init__(self, path, ttl, max_bytes, offline=False):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, headers TEXT NOT NULL, "
+            "body BLOB NOT NULL, size INTEGER NOT NULL, fetched_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        return sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+
+    def reopen(self):
+        """Opens a new connection; a forked worker must not share its parent's SQLite connection."""
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(requests.utils.requote_uri(url).encode('utf-8')).hexdigest()
+
+    def _fresh(self, fetched_at):
+        return self.offline or time.time() - fetched_at < self.ttl
+
+    def has(self, url):
+        with self._lock:
+            row = self._conn.execute("SELECT fetched_at FROM responses WHERE key = ?", (self._key(url),)).fetchone()
+        return row is not None and self._fresh(row[0])
+
+    def get(self, url):
+        """Returns {'url', 'status', 'headers', 'body', 'fetched_at'} or None on a miss."""
+        key = self._key(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status, headers, body, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or not self._fresh(row[4]):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return {'url': row[0], 'status': row[1], 'headers': json.loads(row[2]),
+                'body': zlib.decompress(row[3]), 'fetched_at': row[4]}
+
+    def put(self, url, status, headers, body):
+        # Bodies are stored decoded, so the transfer headers of the original response no longer apply
+        headers = {name: value for name, value in headers.items() if name.lower() not in self.SKIPPED_HEADERS}
+        compressed = zlib.compress(body, 6)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._key(url), url, status, json.dumps(headers), compressed, len(compressed), now, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if total - freed <= self.max_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def prune(self):
+        """Drops expired entries and enforces the size cap; returns the number of entries removed."""
+        with self._lock:
+            before = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            self._conn.execute("DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.ttl,))
+            self._evict()
+            after = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return before - after
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            entries, size, oldest, newest = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(fetched_at), MAX(fetched_at) FROM responses"
+            ).fetchone()
+        return {
+            'path': self.path,
+            'entries': entries,
+            'compressed_bytes': size,
+            'max_bytes': self.max_bytes,
+            'oldest': datetime.fromtimestamp(oldest).isoformat() if oldest else None,
+            'newest': datetime.fromtimestamp(newest).isoformat() if newest else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'offline': self.offline,
+        }
+
+    def iter_pages(self, url_contains=""):
+        """Yields (url, html) for every cached page whose URL contains url_contains; fixture source for benchmarks."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, body FROM responses WHERE instr(url, ?) > 0 ORDER BY url", (url_contains,)
+            ).fetchall()
+        for url, body in rows:
+            yield url, zlib.decompress(body).decode('utf-8', errors='replace')
+
+http_cache = ResponseCache(http_cache_path, http_cache_ttl, http_cache_max_mb * 1024 * 1024, http_cache_offline) if http_cache_path else None
+
+class CachingHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that answers GET requests from the response cache and stores successful
+    responses in it. Retries only apply to requests that actually reach the network.
+    """
+    def __init__(self, cache, *args, **kwargs):
+        self.cache = cache
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return super().send(request, **kwargs)
+        cached = self.cache.get(request.url)
+        if cached is not None:
+            response = requests.Response()
+            response.status_code = cached['status']
+            response.headers = requests.structures.CaseInsensitiveDict(cached['headers'])
+            response._content = cached['body']
+            response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+            response.url = request.url
+            response.request = request
+            response.reason = 'OK'
+            response.from_cache = True
+            return response
+        if self.cache.offline:
+            raise OfflineCacheMiss(f"Offline mode: {request.url} is not in the response cache", request=request)
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            self.cache.put(request.url, response.status_code, response.headers, response.content)
+        response.from_cache = False
+        return response
+
+def get_session(pool_size=10):
     """Creates a session with retry logic and a modern User-Agent."""
     session = requests.Session()
     retry = Retry(
@@ -188,182 +887,1550 @@ def get_session():
         connect=3,
         backoff_factor=0.5,
         status_forcelist=(500, 502, 503, 504),
+        # 429/403 and Retry-After are handled by the adaptive rate limiter, which every worker shares
+        respect_retry_after_header=False,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    # pool_maxsize must cover the concurrent page workers sharing this session
+    if http_cache is not None:
+        adapter = CachingHTTPAdapter(http_cache, max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
     session.mount('http://', adapter)
     session.mount('https://', adapter)
-    session.headers.update({
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-        'Accept-Language': 'es-ES,es;q=0.9,en;q=0.8',
-        'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-        'Sec-Ch-Ua-Mobile': '?0',
-        'Sec-Ch-Ua-Platform': '"Windows"',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1',
-        'Upgrade-Insecure-Requests': '1'
-    })
+    session.headers.update(BROWSER_HEADERS)
     return session
 
-def scrape_mercado_libre(search_term):
-    base_url = "https://listado.mercadolibre.com.ar/"
-    # Headers are now managed by the session
-    all_items = []
-    page = 1
-    session = get_session()
+class HostBucket:
+    """Token bucket state and observed health of a single host."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        # Tokens refill from this instant on; pushed into the future while the host is blocked
+        self.refill_from = time.monotonic()
+        self.latency = None
+        self.error_rate = 0.0
+        self.consecutive_throttles = 0
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+class AdaptiveRateLimiter:
+    """
+    Per-host token bucket shared by every scraper worker. The refill rate grows additively while
+    the host answers quickly, shrinks when latency goes above target_latency and is halved on
+    429/403/5xx responses; Retry-After blocks the host for the requested time.
+    """
+    THROTTLE_STATUSES = (403, 429)
+    # Weight of the newest sample in the latency and error rate moving averages
+    SMOOTHING = 0.2
+
+    def __init__(self, requests_per_second, min_rate, max_rate, burst=1, target_latency=2.0):
+        self.initial_rate = requests_per_second
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, requests_per_second)
+        self.burst = burst
+        self.target_latency = target_latency
+        self.increase_step = max(requests_per_second * 0.05, 0.01)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host):
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            bucket = self._hosts[host] = HostBucket(self.initial_rate, self.burst)
+        return bucket
+
+    def reserve(self, url):
+        """Takes a token for the URL's host and returns the seconds to wait before using it."""
+        if self.initial_rate <= 0:
+            return 0.0
+        with self._lock:
+            bucket = self._bucket(urlparse(url).netloc)
+            now = time.monotonic()
+            if now > bucket.refill_from:
+                bucket.tokens = min(bucket.burst, bucket.tokens + (now - bucket.refill_from) * bucket.rate)
+                bucket.refill_from = now
+            bucket.tokens -= 1
+            delay = max(0.0, bucket.refill_from - now) + max(0.0, -bucket.tokens / bucket.rate)
+            bucket.requests += 1
+            bucket.waited += delay
+        return delay
+
+    def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def parse_retry_after(value):
+        """Seconds requested by a Retry-After header (delta-seconds or HTTP date), or None."""
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds())
+
+    def record(self, url, status_code, latency, retry_after=None):
+        """Feeds back the outcome of a request; status_code None means it failed without a response."""
+        if self.initial_rate <= 0:
+            return
+        with self._lock:
+            bucket = self._bucket(urlparse(url).netloc)
+            if latency is not None:
+                bucket.latency = latency if bucket.latency is None else (
+                    (1 - self.SMOOTHING) * bucket.latency + self.SMOOTHING * latency)
+            failed = status_code is None or status_code in self.THROTTLE_STATUSES or status_code >= 500
+            bucket.error_rate = (1 - self.SMOOTHING) * bucket.error_rate + self.SMOOTHING * failed
+
+            if status_code in self.THROTTLE_STATUSES:
+                bucket.throttled += 1
+                bucket.consecutive_throttles += 1
+                pause = self.parse_retry_after(retry_after)
+                if pause is None:
+                    pause = min(60.0, 2.0 ** bucket.consecutive_throttles)
+                bucket.refill_from = max(bucket.refill_from, time.monotonic() + pause)
+                # One token is ready when the pause ends, so the retry goes out right after Retry-After
+                bucket.tokens = min(bucket.burst, 1.0)
+                bucket.rate = max(self.min_rate, bucket.rate / 2)
+                return
+            bucket.consecutive_throttles = 0
+            if failed:
+                bucket.rate = max(self.min_rate, bucket.rate / 2)
+            elif bucket.latency is not None and bucket.latency > self.target_latency:
+                bucket.rate = max(self.min_rate, bucket.rate * 0.8)
+            else:
+                bucket.rate = min(self.max_rate, bucket.rate + self.increase_step)
+
+    def metrics(self):
+        """Current rate, smoothed latency and error rate, and the total time spent waiting, per host."""
+        with self._lock:
+            now = time.monotonic()
+            return {host: {
+                'rate': round(bucket.rate, 3),
+                'latency': round(bucket.latency, 3) if bucket.latency is not None else None,
+                'error_rate': round(bucket.error_rate, 3),
+                'requests': bucket.requests,
+                'throttled': bucket.throttled,
+                'waited_seconds': round(bucket.waited, 3),
+                'blocked_for': round(max(0.0, bucket.refill_from - now), 3),
+            } for host, bucket in self._hosts.items()}
+
+rate_limiter = AdaptiveRateLimiter(scraper_requests_per_second, scraper_min_requests_per_second,
+                                   scraper_max_requests_per_second, scraper_burst, scraper_target_latency)
+
+def parse_total_results(text):
+    """Reads the total result count shown above the listing (e.g. '1.234 resultados')."""
+    digits = re.sub(r"\D", "", text or "")
+    return int(digits) if digits else None
+
+def list_item_text(li):
+    """
+    Text of a bs4 <li> without the text of <li> elements nested in it: html.parser nests the next
+    item inside an unclosed <li>, where lxml (like browsers) closes it first.
+    """
+    if li.find('li') is None:
+        return li.text
+    return "".join(text for text in li.strings if text.find_parent('li') is li)
 
-    # Initial URL for the first page
-    url = f"{base_url}{search_term.replace(' ', '-')}_Desde_1"
+def extract_cards_bs4(html, skip_card=None):
+    """
+    BeautifulSoup backend: extracts the raw text of every card field from a listing page.
+    Cards for which skip_card(link, price text) is true only get their link and price read,
+    marked 'skipped'.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    page = {'no_results': None, 'selector': 'ui-search-result__wrapper', 'cards': [], 'body': None,
+            'next_url': None, 'total_results': None}
+    no_results = soup.find('p', class_='ui-search-sidebar__no-results-message')
+    if no_results:
+        page['no_results'] = no_results.text.strip()
+        return page
+
+    items = soup.find_all('div', class_='ui-search-result__wrapper')
+    # If no items found with old class, try new poly-card class
+    if not items:
+        page['selector'] = 'poly-card'
+        items = soup.find_all('div', class_=lambda x: x and 'poly-card' in x and 'andes-card' in x)
+    if not items:
+        body = soup.find('body')
+        page['body'] = str(body)[:500] if body else None
+        return page
+
+    for item in items:
+        title_elem = item.find('a', class_='poly-component__title')
+        price_elem = item.find('span', class_='andes-money-amount__fraction')
+        if skip_card is not None:
+            link, price = title_elem.get('href') if title_elem else None, price_elem.text if price_elem else None
+            if skip_card(link, price):
+                page['cards'].append({'link': link, 'price': price, 'skipped': True})
+                continue
+        location_elem = item.find('span', class_='poly-component__location')
+        page['cards'].append({
+            'title': title_elem.text if title_elem else None,
+            'link': title_elem.get('href') if title_elem else None,
+            'picture': extract_picture_url(item),
+            'price': price_elem.text if price_elem else None,
+            'details': [list_item_text(li) for li in item.find_all('li', class_='poly-attributes_list__item')],
+            'location': location_elem.text if location_elem else None,
+        })
+
+    # Pagination Logic
+    next_btn = soup.find('li', class_='andes-pagination__button--next')
+    next_link = next_btn.find('a') if next_btn else None
+
+    # Fallback for next link if class structure changed
+    if not next_link:
+         next_link = soup.find('a', title='Siguiente')
+
+    page['next_url'] = next_link.get('href') if next_link else None
+    quantity = soup.find('span', class_='ui-search-search-result__quantity-results')
+    page['total_results'] = parse_total_results(quantity.text) if quantity else None
+    return page
+
+def _has_class(css_class):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')"
+
+if lxml_html is not None:
+    # Compiled once at import; the same XPath objects are reused for every page
+    LXML_SELECTORS = {
+        'no_results': etree.XPath(f"//p[{_has_class('ui-search-sidebar__no-results-message')}]"),
+        'wrapper': etree.XPath(f"//div[{_has_class('ui-search-result__wrapper')}]"),
+        'poly_card': etree.XPath("//div[contains(@class, 'poly-card') and contains(@class, 'andes-card')]"),
+        # Link and price only, to tell cards already parsed in a batch run apart
+        'card_link': etree.XPath(f"(.//a[{_has_class('poly-component__title')}])[1]/@href"),
+        'card_price': etree.XPath(f"(.//span[{_has_class('andes-money-amount__fraction')}])[1]"),
+        # Every field of a card in a single document-order query
+        'card_fields': etree.XPath(" | ".join([
+            f".//a[{_has_class('poly-component__title')}]",
+            f".//img[{_has_class('poly-component__picture')}]",
+            f".//span[{_has_class('andes-money-amount__fraction')}]",
+            f".//li[{_has_class('poly-attributes_list__item')}]",
+            f".//span[{_has_class('poly-component__location')}]",
+        ])),
+        'next': etree.XPath(f"(//li[{_has_class('andes-pagination__button--next')}])[1]//a"),
+        'next_fallback': etree.XPath("//a[@title='Siguiente']"),
+        'quantity': etree.XPath(f"//span[{_has_class('ui-search-search-result__quantity-results')}]"),
+        'body': etree.XPath("//body"),
+    }
+    lxml_parser = lxml_html.HTMLParser(encoding='utf-8')
+
+def extract_card_lxml(card):
+    fields = {'title': None, 'link': None, 'picture': "", 'price': None, 'details': [], 'location': None}
+    seen = set()
+    for node in LXML_SELECTORS['card_fields'](card):
+        classes = node.get('class', '').split()
+        if node.tag == 'li':
+            fields['details'].append(node.text_content())
+            continue
+        if node.tag == 'a':
+            field = 'title'
+        elif node.tag == 'img':
+            field = 'picture'
+        elif 'andes-money-amount__fraction' in classes:
+            field = 'price'
+        else:
+            field = 'location'
+        # Like find(), only the first match of each field counts
+        if field in seen:
+            continue
+        seen.add(field)
+        if field == 'title':
+            fields['title'] = node.text_content()
+            fields['link'] = node.get('href')
+        elif field == 'picture':
+            src = node.get('src', "")
+            if not src or src.startswith("data:image"):
+                src = node.get('data-src') or node.get('data-original') or ""
+            fields['picture'] = src
+        else:
+            fields[field] = node.text_content()
+    return fields
 
-    while True:
+def skippable_card_lxml(card, skip_card):
+    """The link and price of a card for which skip_card(link, price text) is true, marked 'skipped'; None otherwise."""
+    link = LXML_SELECTORS['card_link'](card)
+    price = LXML_SELECTORS['card_price'](card)
+    link, price = str(link[0]) if link else None, price[0].text_content() if price else None
+    return {'link': link, 'price': price, 'skipped': True} if skip_card(link, price) else None
+
+def extract_cards_lxml(html, skip_card=None):
+    """
+    lxml backend: same contract as extract_cards_bs4, using the precompiled XPath selectors.
+    """
+    page = {'no_results': None, 'selector': 'ui-search-result__wrapper', 'cards': [], 'body': None,
+            'next_url': None, 'total_results': None}
+    try:
+        root = lxml_html.fromstring(html.encode('utf-8'), parser=lxml_parser)
+    except etree.ParserError:
+        # Empty or whitespace-only document; html.parser just finds no cards in it
+        page['selector'] = 'poly-card'
+        return page
+    no_results = LXML_SELECTORS['no_results'](root)
+    if no_results:
+        page['no_results'] = no_results[0].text_content().strip()
+        return page
+
+    items = LXML_SELECTORS['wrapper'](root)
+    if not items:
+        page['selector'] = 'poly-card'
+        items = LXML_SELECTORS['poly_card'](root)
+    if not items:
+        body = LXML_SELECTORS['body'](root)
+        page['body'] = etree.tostring(body[0], encoding='unicode')[:500] if body else None
+        return page
+
+    if skip_card is None:
+        page['cards'] = [extract_card_lxml(item) for item in items]
+    else:
+        page['cards'] = [skippable_card_lxml(item, skip_card) or extract_card_lxml(item) for item in items]
+    next_link = LXML_SELECTORS['next'](root) or LXML_SELECTORS['next_fallback'](root)
+    page['next_url'] = next_link[0].get('href') if next_link else None
+    quantity = LXML_SELECTORS['quantity'](root)
+    page['total_results'] = parse_total_results(quantity[0].text_content()) if quantity else None
+    return page
+
+PARSER_BACKENDS = {'bs4': extract_cards_bs4}
+if lxml_html is not None:
+    PARSER_BACKENDS['lxml'] = extract_cards_lxml
+
+parser_backend = os.getenv("PARSER_BACKEND", "lxml" if lxml_html is not None else "bs4")
+if parser_backend not in PARSER_BACKENDS:
+    logger.warning(f"Parser backend '{parser_backend}' is not available, falling back to BeautifulSoup.")
+    parser_backend = 'bs4'
+
+def build_item(card, search_term):
+    """Turns the raw card fields of any parser backend into the stored item dict."""
+    title = card['title'].strip() if card['title'] else 'No title'
+    link = card['link'] or '#'
+    unique_id = extract_unique_id(link)
+    if not unique_id:
+        web_logger.debug("DEBUG: Could not extract unique ID from link: %s...", link[:50])
+        return None
+    picture_url = card['picture']
+    price_text = card['price'].strip() if card['price'] else 'N/A'
+
+    price_num = 0
+    if price_text != 'N/A':
+        try:
+            # Remove existing formatting to get raw number
+            price_num = int(price_text.replace('.', '').replace(',', '').strip())
+        except ValueError:
+            price_num = 0
+
+    currency, price_formatted = determine_currency_and_format(price_num)
+
+    details = card['details']
+    year = details[0].strip() if len(details) > 0 and details[0] else 'N/A'
+    km = details[1].strip() if len(details) > 1 and details[1] else 'N/A'
+    location = card['location'].strip() if card['location'] else 'N/A'
+
+    year_num = int(year) if year != 'N/A' else 0
+    km_num = int(km.replace('Km', '').replace('.', '').strip()) if km != 'N/A' else 0
+    return {
+        'unique_id': unique_id,
+        'image': picture_url,
+        'description': title,
+        'price': price_formatted,
+        'price_num': price_num,
+        'currency': currency,
+        'year': year,
+        'year_num': year_num,
+        'kilometers': km,
+        'kilometers_num': km_num,
+        'location': location,
+        'link': link,
+        'search_term': search_term
+    }
+
+class SeenListings:
+    """
+    Listings parsed and stored during one "Scrapear Todos" run. Overlapping terms ("bmw",
+    "bmw x3") return many of the same listings: the parser backends only read the link and price
+    of a card already parsed at that price, and a listing stored at a price is saved for the other
+    terms as a term membership only. Saves claim the listings they write, so a term that meets a
+    listing another term is still writing waits for that write instead of repeating it.
+    """
+    # Most seconds a save waits for another term's in-flight write of the same listings
+    CLAIM_TIMEOUT = 60
+
+    def __init__(self):
+        # (unique_id, price text) -> item; entries are never replaced, so readers need no lock
+        self._parsed = {}
+        # unique_id -> price_num written in this run
+        self._stored = {}
+        # unique_id -> (price_num, Event set once the batch writing it is done)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.membership_only = 0
+
+    def is_parsed(self, link, price_text):
+        """Whether a card with this link and raw price text was parsed earlier in the run."""
+        return (extract_unique_id(link), price_text) in self._parsed
+
+    def reuse(self, card, search_term):
+        """The item parsed earlier for a card the parser backend skipped, for search_term."""
+        item = self._parsed[(extract_unique_id(card['link']), card['price'])]
+        with self._lock:
+            self.reused += 1
+        return {**item, 'search_term': search_term}
+
+    def remember(self, card, item):
+        with self._lock:
+            self._parsed.setdefault((item['unique_id'], card['price']), item)
+
+    def claim(self, records, wait=True):
+        """
+        Splits records into those this save must write (now claimed), those already stored at
+        the same price, and (record, event) pairs another save is writing at the same price.
+        With wait=False, those last ones are claimed and written too.
+        Returns (write, stored, waiting, done); release(write, done, ...) ends the claim.
+        """
+        write, stored, waiting = [], [], []
+        done = threading.Event()
+        with self._lock:
+            for rec in records:
+                unique_id, price = rec['unique_id'], rec['price_num']
+                pending = self._pending.get(unique_id)
+                if self._stored.get(unique_id) == price:
+                    stored.append(rec)
+                elif wait and pending is not None and pending[0] == price:
+                    waiting.append((rec, pending[1]))
+                else:
+                    write.append(rec)
+                    self._pending[unique_id] = (price, done)
+            self.membership_only += len(stored)
+        return write, stored, waiting, done
+
+    def release(self, records, done, written):
+        """Ends a claim; written records count as stored for later saves."""
+        with self._lock:
+            for rec in records:
+                pending = self._pending.get(rec['unique_id'])
+                if pending is not None and pending[1] is done:
+                    del self._pending[rec['unique_id']]
+                    if written:
+                        self._stored[rec['unique_id']] = rec['price_num']
+        done.set()
+
+    def summary(self):
+        with self._lock:
+            return {'listings': len({unique_id for unique_id, _ in self._parsed}), 'cards_reused': self.reused,
+                    'membership_only_writes': self.membership_only}
+
+# Listings seen by the "Scrapear Todos" run in progress in this context; None outside of one
+seen_listings = contextvars.ContextVar('seen_listings', default=None)
+
+def parse_results_page(html, search_term, backend=None):
+    """
+    Parses one listing page with the configured parser backend.
+    Returns a dict with the parsed 'items', the 'next_url' pagination link and the
+    'total_results' count, or None when the page signals that there is nothing left to scrape.
+    """
+    backend = backend or parser_backend
+    started = time.perf_counter()
+    seen = seen_listings.get()
+    page = PARSER_BACKENDS[backend](html, seen.is_parsed if seen is not None else None)
+    if page['no_results']:
+        metrics.empty_pages.labels('no_results').inc()
+        web_logger.write(f"No results message detected: {page['no_results']}")
+        return None
+
+    if page['selector'] == 'poly-card':
+        metrics.selector_fallbacks.labels(backend).inc()
+        web_logger.debug("DEBUG: Found 0 items with class 'ui-search-result__wrapper'")
+        web_logger.debug("DEBUG: Trying fallback selector 'div.poly-card'...")
+    web_logger.debug("DEBUG: Found %s items with class '%s'", len(page['cards']), page['selector'])
+
+    if not page['cards']:
+        metrics.empty_pages.labels('no_cards').inc()
+        web_logger.write("No items found in page")
+        # Debugging info when no items found
+        web_logger.debug("DEBUG: Dumping first 500 chars of HTML body for inspection:")
+        web_logger.debug(page['body'] if page['body'] else "No body tag found.")
+        return None
+
+    parsed_items = []
+    for card in page['cards']:
+        try:
+            if card.get('skipped'):
+                parsed = seen.reuse(card, search_term)
+            else:
+                parsed = build_item(card, search_term)
+                if parsed and seen is not None:
+                    seen.remember(card, parsed)
+            if parsed:
+                parsed_items.append(parsed)
+                if web_logger.debug_enabled:
+                    web_logger.debug("Added item: %s... (ID: %s)", parsed['description'][:50], parsed['unique_id'])
+        except Exception as e:
+            metrics.item_parse_errors.inc()
+            web_logger.write(f"Error processing item: {e}")
+            continue
+    metrics.page_parse_seconds.labels(backend).observe(time.perf_counter() - started)
+    metrics.page_items.observe(len(parsed_items))
+
+    next_url = page['next_url']
+    return {
+        'items': parsed_items,
+        'next_url': next_url if next_url and next_url.startswith('http') else None,
+        'total_results': page['total_results'],
+    }
+
+def scrape_page(session, url, page, search_term):
+    """
+    Fetches and parses a single result page, honouring the shared per-host rate limit.
+    Returns (parsed_page, response); parsed_page is None when pagination should stop.
+    """
+    for attempt in range(scraper_throttle_retries + 1):
+        # Cached pages never hit the site, so they skip the rate limit
+        if http_cache is None or not http_cache.has(url):
+            rate_limiter.wait(url)
         web_logger.write(f"Scraping page {page}: {url}")
+        started = time.monotonic()
         try:
             response = session.get(url, timeout=10)
-            web_logger.write(f"DEBUG: Status Code: {response.status_code}, Content Length: {len(response.text)}")
+        except requests.RequestException:
+            rate_limiter.record(url, None, None)
+            raise
+        from_cache = getattr(response, 'from_cache', False)
+        metrics.page_fetch_seconds.labels('cache' if from_cache else 'network').observe(time.monotonic() - started)
+        if not from_cache:
+            rate_limiter.record(url, response.status_code, time.monotonic() - started, response.headers.get('Retry-After'))
+        web_logger.debug("DEBUG: Status Code: %s, Content Length: %s", response.status_code, len(response.text))
+        if response.status_code not in AdaptiveRateLimiter.THROTTLE_STATUSES or attempt == scraper_throttle_retries:
+            break
+        web_logger.write(f"Throttled with {response.status_code} on page {page}, retrying ({attempt + 1}/{scraper_throttle_retries})")
+
+    if response.status_code == 404:
+        metrics.pages_not_found.inc()
+        web_logger.write(f"No more pages available (404 error)")
+        return None, response
+    response.raise_for_status()
+    parsed = parse_results_page(response.text, search_term)
+    report_page_progress(len(parsed['items']) if parsed else 0)
+    return parsed, response
+
+def scrape_remaining_pages(session, first_response, last_page, search_term):
+    """
+    Fans pages 2..last_page out to a bounded worker pool.
+    Pages are computed from the first response URL and merged back in page order.
+    """
+    urls = [update_url_pagination(first_response.url, page) for page in range(2, last_page + 1)]
+    web_logger.debug("DEBUG: Fetching %s remaining pages with %s workers", len(urls), scraper_max_workers)
 
-            if response.status_code == 404:
-                web_logger.write(f"No more pages available (404 error)")
-                break
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            no_results = soup.find('p', class_='ui-search-sidebar__no-results-message')
-            if no_results:
-                web_logger.write(f"No results message detected: {no_results.text.strip()}")
-                break
+    def fetch(page_and_url):
+        page, url = page_and_url
+        try:
+            parsed, _ = scrape_page(session, url, page, search_term)
+            return parsed['items'] if parsed else []
+        except Exception as e:
+            web_logger.write(f"Error scraping page {page}: {e}")
+            return []
 
-            items = soup.find_all('div', class_='ui-search-result__wrapper')
-            web_logger.write(f"DEBUG: Found {len(items)} items with class 'ui-search-result__wrapper'")
-
-            # If no items found with old class, try new poly-card class
-            if not items:
-                web_logger.write("DEBUG: Trying fallback selector 'div.poly-card'...")
-                items = soup.find_all('div', class_=lambda x: x and 'poly-card' in x and 'andes-card' in x)
-                web_logger.write(f"DEBUG: Found {len(items)} items with class 'poly-card'")
-
-            if not items:
-                web_logger.write("No items found in page")
-                # Debugging info when no items found
-                web_logger.write("DEBUG: Dumping first 500 chars of HTML body for inspection:")
-                body = soup.find('body')
-                if body:
-                    web_logger.write(str(body)[:500])
-                else:
-                    web_logger.write("No body tag found.")
-                break
+    # Each page runs in a copy of the caller's context so job progress hooks keep working
+    contexts = [contextvars.copy_context() for _ in urls]
+    with ThreadPoolExecutor(max_workers=scraper_max_workers) as pool:
+        # map() yields results in submission order, so pages stay ordered
+        pages = pool.map(lambda context, page_and_url: context.run(fetch, page_and_url), contexts, enumerate(urls, start=2))
+        return [item for page_items in pages for item in page_items]
 
-            for item in items:
-                try:
-                    title_elem = item.find('a', class_='poly-component__title')
-                    title = title_elem.text.strip() if title_elem and title_elem.text else 'No title'
-                    link = title_elem.get('href', '#') if title_elem else '#'
-                    unique_id = extract_unique_id(link)
-                    if not unique_id:
-                        web_logger.write(f"DEBUG: Could not extract unique ID from link: {link[:50]}...")
-                        continue
-                    picture_url = extract_picture_url(item)
-                    price_elem = item.find('span', class_='andes-money-amount__fraction')
-                    price_text = price_elem.text.strip() if price_elem and price_elem.text else 'N/A'
-
-                    price_num = 0
-                    if price_text != 'N/A':
-                        try:
-                            # Remove existing formatting to get raw number
-                            price_num = int(price_text.replace('.', '').replace(',', '').strip())
-                        except ValueError:
-                            price_num = 0
-
-                    currency, price_formatted = determine_currency_and_format(price_num)
-
-                    details = item.find_all('li', class_='poly-attributes_list__item')
-                    year = details[0].text.strip() if len(details) > 0 and details[0].text else 'N/A'
-                    km = details[1].text.strip() if len(details) > 1 and details[1].text else 'N/A'
-                    location_elem = item.find('span', class_='poly-component__location')
-                    location = location_elem.text.strip() if location_elem and location_elem.text else 'N/A'
-
-                    year_num = int(year) if year != 'N/A' else 0
-                    km_num = int(km.replace('Km', '').replace('.', '').strip()) if km != 'N/A' else 0
-                    all_items.append({
-                        'unique_id': unique_id,
-                        'image': picture_url,
-                        'description': title,
-                        'price': price_formatted,
-                        'price_num': price_num,
-                        'currency': currency,
-                        'year': year,
-                        'year_num': year_num,
-                        'kilometers': km,
-                        'kilometers_num': km_num,
-                        'location': location,
-                        'link': link,
-                        'search_term': search_term
-                    })
-                    web_logger.write(f"Added item: {title[:50]}... (ID: {unique_id})")
-                except Exception as e:
-                    web_logger.write(f"Error processing item: {e}")
-                    continue
-            # Pagination Logic
-            next_btn = soup.find('li', class_='andes-pagination__button--next')
-            next_link = next_btn.find('a') if next_btn else None
+def expected_pages(total_results):
+    return min(math.ceil(total_results / ITEMS_PER_PAGE), scraper_max_pages)
+
+def latest_prices(unique_ids):
+    """Returns {unique_id: price_num} with the most recently stored price of each listing."""
+    cursor = latest_listings_collection.find({'_id': {'$in': list(unique_ids)}}, {'price_num': 1})
+    return {doc['_id']: doc.get('price_num') for doc in cursor}
+
+class IncrementalTracker:
+    """
+    Decides when an incremental scrape can stop paginating: after stop_pages consecutive pages
+    whose listings are all already stored with the same price. Also accounts for the pages and
+    requests the early stop saved.
+    """
+    def __init__(self, search_term, stop_pages=None):
+        self.search_term = search_term
+        self.stop_pages = stop_pages or scraper_incremental_stop_pages
+        self.unchanged_streak = 0
+        self.pages_fetched = 0
+        self.pages_expected = None
+        self.started_at = datetime.utcnow()
+        self.stopped_early = False
+
+    def observe(self, items):
+        """Records one scraped page and returns True when pagination should stop."""
+        self.pages_fetched += 1
+        known = latest_prices({item['unique_id'] for item in items})
+        changed = sum(1 for item in items if known.get(item['unique_id']) != item['price_num'])
+        self.unchanged_streak = 0 if changed else self.unchanged_streak + 1
+        web_logger.debug("DEBUG: Incremental page %s: %s new or changed listings", self.pages_fetched, changed)
+        self.stopped_early = self.unchanged_streak >= self.stop_pages
+        return self.stopped_early
+
+    def finish(self, items_scraped):
+        pages_expected = self.pages_expected or self.pages_fetched
+        pages_saved = max(0, pages_expected - self.pages_fetched) if self.stopped_early else 0
+        run = {
+            'search_term': self.search_term,
+            'mode': 'incremental',
+            'started_at': self.started_at,
+            'finished_at': datetime.utcnow(),
+            'items_scraped': items_scraped,
+            'pages_fetched': self.pages_fetched,
+            'pages_expected': pages_expected,
+            'pages_saved': pages_saved,
+            # One request per result page, retries aside
+            'requests_saved': pages_saved,
+            'stopped_early': self.stopped_early,
+        }
+        web_logger.write(f"Incremental scrape for {self.search_term}: {self.pages_fetched} of {pages_expected} pages fetched, "
+                         f"{pages_saved} pages/requests saved")
+        try:
+            scrape_runs_collection.insert_one(dict(run))
+        except Exception as e:
+            web_logger.write(f"Error recording scrape run for {self.search_term}: {e}")
+        return run
+
+def build_search_url(search_term, base_url=None, order=""):
+    return f"{base_url or ml_base_url}{search_term.replace(' ', '-')}{order}_Desde_1"
+
+def scrape_mercado_libre(search_term, concurrent=None, base_url=None, incremental=None):
+    if concurrent is None:
+        concurrent = scraper_concurrent
+    if incremental is None:
+        incremental = scraper_incremental
+    # Incremental runs walk the newest listings first and stop early, so pages go one at a time
+    tracker = IncrementalTracker(search_term) if incremental else None
+    if tracker:
+        concurrent = False
+    started = time.monotonic()
+    # Headers are now managed by the session
+    all_items = []
+    page = 1
+    session = get_session(pool_size=max(10, scraper_max_workers))
 
-            # Fallback for next link if class structure changed
-            if not next_link:
-                 next_link = soup.find('a', title='Siguiente')
+    # Initial URL for the first page
+    url = build_search_url(search_term, base_url, order=scraper_incremental_order if tracker else "")
 
-            next_url = next_link.get('href') if next_link else None
+    while True:
+        try:
+            parsed, response = scrape_page(session, url, page, search_term)
+            if parsed is None:
+                break
+            all_items.extend(parsed['items'])
+
+            total_results = parsed['total_results']
+            if tracker:
+                if page == 1 and total_results:
+                    tracker.pages_expected = expected_pages(total_results)
+                if tracker.observe(parsed['items']):
+                    web_logger.write(f"No new or changed listings in the last {tracker.stop_pages} pages, stopping")
+                    break
+
+            if concurrent and page == 1 and total_results:
+                last_page = expected_pages(total_results)
+                web_logger.debug("DEBUG: %s results reported, scraping %s pages concurrently", total_results, last_page)
+                all_items.extend(scrape_remaining_pages(session, response, last_page, search_term))
+                break
 
-            if next_url and next_url.startswith('http'):
-                url = next_url
-                web_logger.write(f"DEBUG: Found next page link: {url}")
+            if parsed['next_url']:
+                url = parsed['next_url']
+                web_logger.debug("DEBUG: Found next page link: %s", url)
                 page += 1
             else:
-                web_logger.write("DEBUG: No valid 'Next' link found in pagination. Trying calculated URL...")
+                web_logger.debug("DEBUG: No valid 'Next' link found in pagination. Trying calculated URL...")
                 page += 1
                 # Use current response.url to preserve filters/category
                 url = update_url_pagination(response.url, page)
-
-            time.sleep(2)
         except Exception as e:
             web_logger.write(f"Error scraping page {page}: {e}")
             break
     df = pd.DataFrame(all_items)
-    if not df.empty:
-        records = df.to_dict(orient='records')
-        timestamp = datetime.utcnow()
-        today_str = timestamp.strftime('%Y-%m-%d')
-        for rec in records:
-            rec['timestamp'] = timestamp
-            rec['search_term'] = search_term
-            rec['date_str'] = today_str
-            filter_query = {
-                'unique_id': rec['unique_id'],
-                'search_term': search_term,
-                'date_str': today_str
-            }
-            cars_collection.replace_one(filter_query, rec, upsert=True)
+    df.attrs['persist_stats'] = save_listings(df, search_term)
+    search_term_registry.record_scrape(search_term, len(df), time.monotonic() - started)
+    if tracker:
+        df.attrs['scrape_run'] = tracker.finish(len(df))
     return df
 
-def get_historical_data(search_term):
-    print(f"Recuperando datos históricos para: {search_term}")
-    pipeline = [
-        {"$match": {"search_term": search_term}},
-        {"$sort": {"timestamp": -1}},
-        {"$group": {
-            "_id": "$unique_id",
-            "doc": {"$first": "$$ROOT"}
+# Attributes that do not change from one scrape to the next; prices go to price_history
+LISTING_FIELDS = ['unique_id', 'image', 'description', 'year', 'year_num', 'kilometers', 'kilometers_num',
+                  'location', 'link']
+
+def bulk_write_stats(result):
+    return {key: result[f'n{key.capitalize()}'] for key in ('inserted', 'matched', 'modified', 'upserted')}
+
+def latest_listing_update(rec, search_term, today_str, timestamp):
+    """
+    Pipeline update for latest_listings: the stored price moves to prev_* when it is from an
+    earlier day, then today's values are written. Scraped values are wrapped in $literal so a
+    leading '$' is never read as a field path.
+    """
+    moved = {'$lt': ['$date_str', today_str]}
+    return [
+        {'$set': {
+            'prev_price_num': {'$cond': [moved, '$price_num', '$prev_price_num']},
+            'prev_date_str': {'$cond': [moved, '$date_str', '$prev_date_str']},
+        }},
+        {'$set': {
+            **{field: {'$literal': rec.get(field)} for field in LISTING_FIELDS},
+            'price_num': {'$literal': rec['price_num']},
+            'date_str': today_str,
+            'timestamp': timestamp,
+            'search_terms': {'$setUnion': [{'$ifNull': ['$search_terms', []]}, {'$literal': [search_term]}]},
         }},
-        {"$replaceRoot": {"newRoot": "$doc"}}
     ]
-    results = list(cars_collection.aggregate(pipeline))
-    df = pd.DataFrame(results)
+
+def save_listings(df, search_term, listings=None, price_history=None, latest=None, batch_size=None):
+    """
+    Upserts every listing's static attributes into listings, today's price into price_history and
+    the latest snapshot into latest_listings, using unordered bulk_write batches. Within a
+    "Scrapear Todos" run, listings another term already stored at the same price only get the
+    term added. Returns one dict per batch with its inserted, matched, modified and upserted counts.
+    """
+    if df.empty:
+        return []
+    listings = listings_collection if listings is None else listings
+    price_history = price_history_collection if price_history is None else price_history
+    latest = latest_listings_collection if latest is None else latest
+    batch_size = batch_size or mongo_bulk_batch_size
+    timestamp = datetime.utcnow()
+    today_str = timestamp.strftime('%Y-%m-%d')
+
+    def write_batch(number, records, members):
+        listing_ops, price_ops, latest_ops = [], [], []
+        for rec in members:
+            # Attributes, today's price and the latest snapshot were written for an earlier term
+            listing_ops.append(UpdateOne({'_id': rec['unique_id']}, {'$addToSet': {'search_terms': search_term}}))
+            latest_ops.append(UpdateOne({'_id': rec['unique_id']}, {'$addToSet': {'search_terms': search_term}}))
+        for rec in records:
+            listing_ops.append(UpdateOne(
+                {'_id': rec['unique_id']},
+                {'$set': {**{field: rec.get(field) for field in LISTING_FIELDS}, 'last_seen': timestamp},
+                 '$setOnInsert': {'first_seen': timestamp},
+                 '$addToSet': {'search_terms': search_term}},
+                upsert=True
+            ))
+            # Re-scraping on the same day overwrites that day's price instead of adding a point
+            price_ops.append(UpdateOne(
+                {'_id': rec['unique_id']}, {'$set': {f'prices.{today_str}': rec['price_num']}}, upsert=True
+            ))
+            latest_ops.append(UpdateOne(
+                {'_id': rec['unique_id']}, latest_listing_update(rec, search_term, today_str, timestamp), upsert=True
+            ))
+
+        batch_stats = {'batch': number, 'operations': len(listing_ops) + len(price_ops) + len(latest_ops),
+                       'inserted': 0, 'matched': 0, 'modified': 0, 'upserted': 0, 'errors': 0}
+        for collection, operations in ((listings, listing_ops), (price_history, price_ops), (latest, latest_ops)):
+            if not operations:
+                continue
+            try:
+                result = collection.bulk_write(operations, ordered=False).bulk_api_result
+            except BulkWriteError as e:
+                # Unordered batches keep going past failed operations; report what was applied
+                result = e.details
+                web_logger.write(f"Error saving batch {number} for {search_term} in {collection.name}: "
+                                 f"{len(result['writeErrors'])} write errors")
+            for key, value in bulk_write_stats(result).items():
+                batch_stats[key] += value
+            batch_stats['errors'] += len(result['writeErrors'])
+        web_logger.write(f"Saved batch {number} for {search_term}: {batch_stats['operations']} ops, "
+                         f"{batch_stats['upserted']} upserted, {batch_stats['modified']} modified")
+        return batch_stats
+
+    # A listing can show up on two pages while paginating; the last copy wins, as before
+    records = df.drop_duplicates(subset='unique_id', keep='last').to_dict(orient='records')
+    seen = seen_listings.get()
+    if seen is None:
+        return [write_batch(number, records[start:start + batch_size], [])
+                for number, start in enumerate(range(0, len(records), batch_size), start=1)]
+
+    stats = []
+    batches = [records[start:start + batch_size] for start in range(0, len(records), batch_size)]
+    deferred = []
+    wait = True
+    while batches:
+        write, stored, waiting, done = seen.claim(batches.pop(0), wait=wait)
+        batch_stats = None
+        try:
+            batch_stats = write_batch(len(stats) + 1, write, stored)
+        finally:
+            # Only a fully applied batch lets other terms skip rewriting its listings
+            seen.release(write, done, batch_stats is not None and not batch_stats['errors'])
+        stats.append(batch_stats)
+        deferred.extend(waiting)
+        if not batches and deferred:
+            # Listings another term was writing: once it is done they only need this term added,
+            # or, if its write failed or is still running, a full write of their own
+            for _, event in deferred:
+                event.wait(SeenListings.CLAIM_TIMEOUT)
+            pending = [rec for rec, _ in deferred]
+            batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+            deferred = []
+            wait = False
+    return stats
+
+class AsyncScrapeEngine:
+    """
+    Scrapes many search terms at once on a single asyncio event loop.
+    A global semaphore caps the in-flight requests across every term, and each term runs
+    in its own task so it can be cancelled without affecting the others.
+    Returns the same item dicts as scrape_mercado_libre, one DataFrame per term.
+    """
+    # Seconds between two reads of the cancellations recorded in scrape_jobs
+    CANCEL_POLL_INTERVAL = 2.0
+
+    def __init__(self, max_concurrency=None, base_url=None, incremental=None):
+        self.max_concurrency = max_concurrency or scraper_async_concurrency
+        self.base_url = base_url or ml_base_url
+        self.incremental = scraper_incremental if incremental is None else incremental
+        self._loop = None
+        self._semaphore = None
+        self._tasks = {}
+        self._cancelled = set()
+
+    def cancel(self, search_term):
+        """Cancels a single term. Safe to call from any thread while the engine runs."""
+        self._cancelled.add(search_term)
+        task = self._tasks.get(search_term)
+        if task and self._loop:
+            self._loop.call_soon_threadsafe(task.cancel)
+        return search_term in self._tasks
+
+    async def _watch_cancellations(self, search_terms, started):
+        """Cancels the terms /scrape_all/cancel recorded since started, possibly from another worker process."""
+        while True:
+            await asyncio.sleep(self.CANCEL_POLL_INTERVAL)
+            try:
+                terms = await asyncio.to_thread(cancelled_terms, search_terms, started)
+            except Exception as e:
+                web_logger.debug("DEBUG: Could not read cancellations: %s", e)
+                continue
+            for term in terms:
+                if term not in self._cancelled:
+                    web_logger.write(f"Cancelación pedida para: {term}")
+                    self.cancel(term)
+
+    async def _cached_get(self, client, url):
+        """client.get through the shared response cache, when one is configured."""
+        if http_cache is None:
+            return await client.get(url)
+        cached = await asyncio.to_thread(http_cache.get, url)
+        if cached is not None:
+            return httpx.Response(cached['status'], headers=cached['headers'], content=cached['body'],
+                                  request=httpx.Request('GET', url))
+        if http_cache.offline:
+            raise OfflineCacheMiss(f"Offline mode: {url} is not in the response cache")
+        response = await client.get(url)
+        if response.status_code == 200:
+            # Keyed by the requested URL, like CachingHTTPAdapter, so pages that redirect are found again
+            await asyncio.to_thread(http_cache.put, url, response.status_code, response.headers, response.content)
+        return response
+
+    async def _fetch_page(self, client, url, page, search_term):
+        for attempt in range(scraper_throttle_retries + 1):
+            async with self._semaphore:
+                cached = http_cache is not None and http_cache.has(url)
+                if not cached:
+                    delay = rate_limiter.reserve(url)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                web_logger.write(f"Scraping page {page}: {url}")
+                started = time.monotonic()
+                try:
+                    response = await self._cached_get(client, url)
+                except httpx.HTTPError:
+                    rate_limiter.record(url, None, None)
+                    raise
+            metrics.page_fetch_seconds.labels('cache' if cached else 'network').observe(time.monotonic() - started)
+            if not cached:
+                rate_limiter.record(url, response.status_code, time.monotonic() - started, response.headers.get('Retry-After'))
+            web_logger.debug("DEBUG: Status Code: %s, Content Length: %s", response.status_code, len(response.text))
+            if response.status_code not in AdaptiveRateLimiter.THROTTLE_STATUSES or attempt == scraper_throttle_retries:
+                break
+            web_logger.write(f"Throttled with {response.status_code} on page {page}, retrying ({attempt + 1}/{scraper_throttle_retries})")
+
+        if response.status_code == 404:
+            metrics.pages_not_found.inc()
+            web_logger.write(f"No more pages available (404 error)")
+            return None, response
+        response.raise_for_status()
+        # Parsing is CPU bound; keep it off the event loop so other fetches keep flowing
+        parsed = await asyncio.to_thread(parse_results_page, response.text, search_term)
+        report_page_progress(len(parsed['items']) if parsed else 0)
+        return parsed, response
+
+    async def _fetch_page_items(self, client, url, page, search_term):
+        try:
+            parsed, _ = await self._fetch_page(client, url, page, search_term)
+            return parsed['items'] if parsed else []
+        except Exception as e:
+            web_logger.write(f"Error scraping page {page}: {e}")
+            return []
+
+    async def _scrape_term(self, client, search_term):
+        if search_term in self._cancelled:
+            raise asyncio.CancelledError()
+        web_logger.write(f"Iniciando scrape masivo para: {search_term}")
+        started = time.monotonic()
+        all_items = []
+        page = 1
+        tracker = IncrementalTracker(search_term) if self.incremental else None
+        url = build_search_url(search_term, self.base_url, order=scraper_incremental_order if tracker else "")
+
+        while True:
+            try:
+                parsed, response = await self._fetch_page(client, url, page, search_term)
+                if parsed is None:
+                    break
+                all_items.extend(parsed['items'])
+
+                total_results = parsed['total_results']
+                if tracker:
+                    # Early stop needs each page checked before the next one, so no fan-out here
+                    if page == 1 and total_results:
+                        tracker.pages_expected = expected_pages(total_results)
+                    if await asyncio.to_thread(tracker.observe, parsed['items']):
+                        web_logger.write(f"No new or changed listings in the last {tracker.stop_pages} pages, stopping")
+                        break
+                elif page == 1 and total_results:
+                    last_page = expected_pages(total_results)
+                    pages = await asyncio.gather(*(
+                        self._fetch_page_items(client, update_url_pagination(str(response.url), p), p, search_term)
+                        for p in range(2, last_page + 1)
+                    ))
+                    for page_items in pages:
+                        all_items.extend(page_items)
+                    break
+
+                page += 1
+                url = parsed['next_url'] or update_url_pagination(str(response.url), page)
+            except Exception as e:
+                web_logger.write(f"Error scraping page {page}: {e}")
+                break
+
+        df = pd.DataFrame(all_items)
+        df.attrs['persist_stats'] = await asyncio.to_thread(save_listings, df, search_term)
+        await asyncio.to_thread(search_term_registry.record_scrape, search_term, len(df), time.monotonic() - started)
+        if tracker:
+            df.attrs['scrape_run'] = await asyncio.to_thread(tracker.finish, len(df))
+        return df
+
+    async def scrape_terms(self, search_terms):
+        # Truncated to the milliseconds Mongo stores, so a cancellation in the same millisecond counts
+        started = datetime.utcnow()
+        started = started.replace(microsecond=started.microsecond // 1000 * 1000)
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        limits = httpx.Limits(max_connections=self.max_concurrency)
+        async with httpx.AsyncClient(headers=BROWSER_HEADERS, timeout=10, follow_redirects=True, limits=limits) as client:
+            for term in search_terms:
+                self._tasks[term] = asyncio.create_task(self._scrape_term(client, term))
+            watcher = asyncio.create_task(self._watch_cancellations(list(self._tasks), started))
+            try:
+                results = await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            finally:
+                watcher.cancel()
+
+        dfs = {}
+        for term, result in zip(self._tasks, results):
+            if isinstance(result, asyncio.CancelledError):
+                web_logger.write(f"Scrape cancelado para: {term}")
+            elif isinstance(result, BaseException):
+                web_logger.write(f"Error scraping {term}: {result}")
+            else:
+                dfs[term] = result
+        return dfs
+
+    def run(self, search_terms):
+        return asyncio.run(self.scrape_terms(search_terms))
+
+# Engines currently running a batch, so /scrape_all/cancel can reach them from another request
+active_engines = set()
+
+def request_cancellation(search_term):
+    """
+    Records a cancellation of search_term in scrape_jobs. The engines of every worker process poll
+    for it, so batches running in another process stop the term too.
+    """
+    now = datetime.utcnow()
+    scrape_jobs_collection.update_one({'_id': f"cancel:{search_term}"}, {'$set': {
+        'search_term': search_term, 'requested_at': now, 'created_at': now}}, upsert=True)
+
+def cancelled_terms(search_terms, since):
+    """The terms among search_terms whose cancellation was requested after since."""
+    return [doc['search_term'] for doc in scrape_jobs_collection.find(
+        {'_id': {'$in': [f"cancel:{term}" for term in search_terms]}, 'requested_at': {'$gte': since}},
+        {'search_term': 1}
+    )]
+
+def scrape_all_terms(search_terms, incremental=None):
+    """
+    Scrapes every term and returns {term: DataFrame}.
+    Uses the asyncio engine when httpx is installed, otherwise falls back to one term at a time.
+    Listings shared by several terms are parsed and stored once per run; every term's DataFrame
+    still holds all of its listings.
+    """
+    seen = SeenListings()
+    token = seen_listings.set(seen)
+    try:
+        if httpx is None:
+            web_logger.debug("DEBUG: httpx is not installed, scraping terms sequentially")
+            dfs = {}
+            for term in search_terms:
+                web_logger.write(f"Iniciando scrape masivo para: {term}")
+                try:
+                    dfs[term] = scrape_mercado_libre(term, incremental=incremental)
+                except Exception as e:
+                    web_logger.write(f"Error scraping {term}: {e}")
+            return dfs
+
+        engine = AsyncScrapeEngine(incremental=incremental)
+        active_engines.add(engine)
+        try:
+            return engine.run(search_terms)
+        finally:
+            active_engines.discard(engine)
+    finally:
+        seen_listings.reset(token)
+        summary = seen.summary()
+        web_logger.write(f"Batch scrape: {summary['listings']} distinct listings, {summary['cards_reused']} cards "
+                         f"repeated across terms reused, {summary['membership_only_writes']} saved as term membership only")
+
+class ScrapeJob:
+    """
+    A scrape submitted to the background worker pool, with its progress counters and result.
+    Its state is also saved to scrape_jobs, so any worker process can report on it, next to the
+    claim that keeps other worker processes from running the same scrape.
+    """
+    # Least seconds between two progress snapshots
+    SAVE_INTERVAL = 2.0
+    # Seconds a claim outlives the last save of its job, so a worker that dies does not hold it for good
+    CLAIM_LEASE = 600
+
+    def __init__(self, kind, search_terms, incremental=False):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.search_terms = list(search_terms)
+        self.incremental = incremental
+        self.status = 'queued'
+        self.pages_done = 0
+        self.items_found = 0
+        self.error = None
+        self.df = None
+        self.result_id = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.logs = web_logger.new_buffer()
+        self.claim_id = None
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+
+    SNAPSHOT_FIELDS = ['kind', 'search_terms', 'incremental', 'status', 'pages_done', 'items_found', 'error',
+                       'result_id', 'created_at', 'started_at', 'finished_at']
+
+    @classmethod
+    def from_snapshot(cls, doc):
+        """A job run by another worker process; its frame comes from the shared results cache and its logs stay there."""
+        job = cls(doc['kind'], doc['search_terms'], doc.get('incremental', False))
+        job.id = doc['_id']
+        for field in cls.SNAPSHOT_FIELDS:
+            setattr(job, field, doc.get(field))
+        job.logs.close()
+        if job.result_id:
+            job.df = results_cache.get(job.result_id)
+        return job
+
+    def save(self):
+        self._saved_at = time.monotonic()
+        snapshot = {field: getattr(self, field) for field in self.SNAPSHOT_FIELDS}
+        try:
+            scrape_jobs_collection.replace_one({'_id': self.id}, snapshot, upsert=True)
+            if self.claim_id and self.status in ('queued', 'running'):
+                scrape_jobs_collection.update_one({'_id': self.claim_id, 'job_id': self.id}, {'$set': {
+                    'expires_at': datetime.utcnow() + timedelta(seconds=self.CLAIM_LEASE)}})
+        except Exception as e:
+            logger.warning(f"Could not save the snapshot of job {self.id}: {e}")
+
+    def claim(self, claim_id):
+        """
+        Claims claim_id in scrape_jobs for this job and returns the id of the job holding it.
+        The upsert only matches a released or expired claim, so while another job holds it the
+        insert fails on the _id instead and that job's id is returned.
+        """
+        try:
+            for _ in range(3):
+                now = datetime.utcnow()
+                try:
+                    scrape_jobs_collection.update_one(
+                        {'_id': claim_id, '$or': [{'status': 'released'}, {'expires_at': {'$lt': now}}]},
+                        {'$set': {'status': 'claimed', 'job_id': self.id, 'created_at': now,
+                                  'expires_at': now + timedelta(seconds=self.CLAIM_LEASE)}},
+                        upsert=True
+                    )
+                except DuplicateKeyError:
+                    # The holder may release or lose its claim before it is read back; then claim again
+                    doc = scrape_jobs_collection.find_one(
+                        {'_id': claim_id, 'status': 'claimed', 'expires_at': {'$gte': now}}, {'job_id': 1})
+                    if doc:
+                        return doc['job_id']
+                    continue
+                self.claim_id = claim_id
+                return self.id
+        except Exception as e:
+            logger.warning(f"Could not claim {claim_id} for job {self.id}, running it unclaimed: {e}")
+        return self.id
+
+    def release(self):
+        if self.claim_id is None:
+            return
+        try:
+            scrape_jobs_collection.update_one({'_id': self.claim_id, 'job_id': self.id}, {'$set': {'status': 'released'}})
+        except Exception as e:
+            logger.warning(f"Could not release {self.claim_id} for job {self.id}: {e}")
+        self.claim_id = None
+
+    def discard(self):
+        """Drops a job that was never run, because another worker process already runs the same scrape."""
+        self.logs.close()
+        try:
+            scrape_jobs_collection.delete_one({'_id': self.id})
+        except Exception as e:
+            logger.warning(f"Could not delete the snapshot of job {self.id}: {e}")
+
+    def add_page(self, items_found):
+        with self._lock:
+            self.pages_done += 1
+            self.items_found += items_found
+            due = time.monotonic() - self._saved_at >= self.SAVE_INTERVAL
+        if due:
+            self.save()
+
+    def to_dict(self):
+        finished = self.finished_at or datetime.utcnow()
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'search_terms': self.search_terms,
+            'incremental': self.incremental,
+            'status': self.status,
+            'pages_done': self.pages_done,
+            'items_found': self.items_found,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'elapsed_seconds': round((finished - self.started_at).total_seconds(), 1) if self.started_at else 0,
+        }
+
+# Job whose scrape is running in the current thread or task; read by the progress hooks
+current_job = contextvars.ContextVar('current_job', default=None)
+
+def report_page_progress(items_found):
+    job = current_job.get()
+    if job is not None:
+        job.add_page(items_found)
+
+class ScrapeJobManager:
+    """
+    Runs scrapes on a bounded in-process worker pool so requests return a job id immediately.
+    Submitting a scrape that is already queued or running, in this or any other worker process,
+    returns the existing job.
+    """
+    def __init__(self, max_workers, max_jobs):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape-job')
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _job_key(kind, search_terms):
+        return ('scrape_all',) if kind == 'scrape_all' else (kind, *search_terms)
+
+    @staticmethod
+    def _claim_id(key):
+        return 'in-flight:' + json.dumps(key, ensure_ascii=False)
+
+    def submit(self, kind, search_terms, incremental=False):
+        """Returns (job, deduplicated)."""
+        key = self._job_key(kind, search_terms)
+        with self._lock:
+            job_id = self._in_flight.get(key)
+            if job_id is not None:
+                return self._jobs[job_id], True
+            job = ScrapeJob(kind, search_terms, incremental)
+            # Saved before claiming, so whoever finds the claim can read the job it points to
+            job.save()
+            holder = job.claim(self._claim_id(key))
+            if holder != job.id:
+                existing = self._load(holder)
+                if existing is not None:
+                    job.discard()
+                    return existing, True
+            self._jobs[job.id] = job
+            self._in_flight[key] = job.id
+            self._prune()
+        self._executor.submit(self._run, job, key)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load(job_id)
+
+    @staticmethod
+    def _load(job_id):
+        # Submitted to another worker process; only its snapshot is shared
+        try:
+            doc = scrape_jobs_collection.find_one({'_id': job_id})
+        except Exception as e:
+            logger.warning(f"Could not read the snapshot of job {job_id}: {e}")
+            return None
+        return ScrapeJob.from_snapshot(doc) if doc else None
+
+    def _prune(self):
+        # Forget the oldest finished jobs; queued and running ones are always kept
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ('done', 'failed')]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, key):
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        job.save()
+        token = current_job.set(job)
+        web_logger.bind(job.logs)
+        try:
+            if job.kind == 'scrape_all':
+                all_dfs = [d for d in scrape_all_terms(job.search_terms, job.incremental).values() if not d.empty]
+                job.df = pd.concat(all_dfs, ignore_index=True) if all_dfs else pd.DataFrame()
+            else:
+                job.df = scrape_mercado_libre(job.search_terms[0], incremental=job.incremental)
+            job.result_id = results_cache.put(job.df)
+            job.status = 'done'
+        except Exception as e:
+            web_logger.write(f"Error in job {job.id}: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            current_job.reset(token)
+            job.finished_at = datetime.utcnow()
+            job.logs.close()
+            job.save()
+            job.release()
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+job_manager = ScrapeJobManager(scrape_job_workers, scrape_job_history)
+
+def get_historical_data(search_term):
+    print(f"Recuperando datos históricos para: {search_term}")
+    df = pd.DataFrame(list(latest_listings_collection.find({'search_terms': search_term}, {'search_terms': 0})))
+    if not df.empty:
+        df['search_term'] = search_term
     return df
 
-@app.route('/', methods=['GET', 'POST'])
-def index():
+def compute_price_variations(df):
+    """
+    Computes the ↑/↓/= badge of every row from the previous price kept in latest_listings.
+    Frames read from latest_listings already carry it; freshly scraped frames look it up by _id.
+    """
+    if df.empty:
+        return np.array([], dtype=object)
+    curr_price = pd.to_numeric(df['price_num'], errors='coerce').to_numpy(dtype=float)
+    if 'prev_price_num' in df.columns:
+        prev_price = pd.to_numeric(df['prev_price_num'], errors='coerce').to_numpy(dtype=float)
+    else:
+        today_str = datetime.utcnow().strftime('%Y-%m-%d')
+        row_date = df['date_str'].fillna(today_str) if 'date_str' in df.columns else pd.Series(today_str, index=df.index)
+        latest = pd.DataFrame(list(latest_listings_collection.find(
+            {'_id': {'$in': df['unique_id'].unique().tolist()}},
+            {'price_num': 1, 'date_str': 1, 'prev_price_num': 1}
+        )), columns=['_id', 'price_num', 'date_str', 'prev_price_num']).set_index('_id')
+        stored = latest.reindex(df['unique_id'].to_numpy())
+        stored_date = stored['date_str'].fillna('').to_numpy(dtype=object)
+        # The row is the stored latest snapshot, or newer than it when it has not been saved yet
+        prev_price = np.where(
+            stored_date == row_date.to_numpy(dtype=object), stored['prev_price_num'].to_numpy(dtype=float),
+            np.where((stored_date != '') & (stored_date < row_date.to_numpy(dtype=object)),
+                     stored['price_num'].to_numpy(dtype=float), np.nan)
+        )
+    return np.select(
+        [np.isnan(prev_price), curr_price > prev_price, curr_price < prev_price],
+        ['', '↑', '↓'],
+        default='='
+    ).astype(object)
+
+class ResultsCache:
+    """
+    Keeps the processed result frames of recent searches so /api/results can page through them.
+    The least recently used frame is evicted past max_entries, and frames expire after ttl seconds.
+    With a directory, frames are also pickled there, so the worker processes of a multi-worker
+    server can serve result ids handed out by each other.
+    """
+    def __init__(self, max_entries, ttl, directory=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, result_id):
+        return os.path.join(self.directory, f"{result_id}.pkl")
+
+    def _store(self, result_id, created, df):
+        with self._lock:
+            self._entries[result_id] = (created, df)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def put(self, df):
+        result_id = uuid.uuid4().hex
+        self._store(result_id, time.monotonic(), df)
+        if self.directory:
+            # Written aside and renamed, so other workers never read a partial file
+            path = self._path(result_id)
+            df.to_pickle(f"{path}.tmp", compression=None)
+            os.replace(f"{path}.tmp", path)
+            self._prune_directory()
+        return result_id
+
+    def get(self, result_id):
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                created, df = entry
+                if time.monotonic() - created <= self.ttl:
+                    self._entries.move_to_end(result_id)
+                    return df
+                del self._entries[result_id]
+                return None
+        if not self.directory or not re.fullmatch(r"[0-9a-f]{32}", result_id):
+            return None
+        try:
+            age = time.time() - os.path.getmtime(self._path(result_id))
+            if age > self.ttl:
+                return None
+            df = pd.read_pickle(self._path(result_id), compression=None)
+        except OSError:
+            return None
+        self._store(result_id, time.monotonic() - age, df)
+        return df
+
+    def _prune_directory(self):
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith('.pkl') and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+results_cache = ResultsCache(results_cache_size, results_cache_ttl, results_cache_dir)
+
+# Sort key of each results table column, in DataTables column order (None = not sortable)
+RESULT_SORT_COLUMNS = [None, 'description', 'normalized_price', 'currency', 'year_num', 'kilometers_num', 'location', None, 'variación']
+RESULT_SEARCH_COLUMNS = ['description', 'price', 'currency', 'year', 'kilometers', 'location', 'variación']
+RESULT_ROW_COLUMNS = ['image', 'description', 'price', 'currency', 'year', 'kilometers', 'location', 'link', 'variación',
+                      'unique_id', 'search_term']
+
+def _number_arg(args, name):
+    try:
+        value = float(args.get(name, ''))
+    except ValueError:
+        return None
+    return None if math.isnan(value) else value
+
+def _column(df, name, default):
+    return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
+def filter_results(df, args):
+    """
+    Applies the results page filters (price, year and km ranges, location, evolution and the
+    DataTables search box) to a processed result frame.
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, low, high in (('normalized_price', 'minPrice', 'maxPrice'),
+                              ('year_num', 'minYear', 'maxYear'),
+                              ('kilometers_num', 'minKm', 'maxKm')):
+        values = pd.to_numeric(_column(df, column, 0), errors='coerce').fillna(0).to_numpy()
+        # An empty or zero bound means "no bound", as in the original client-side filter
+        mask &= (values >= (_number_arg(args, low) or 0)) & (values <= (_number_arg(args, high) or np.inf))
+
+    location = args.get('locationFilter', '').lower()
+    if location:
+        mask &= _column(df, 'location', '').fillna('').astype(str).str.lower().str.contains(location, regex=False).to_numpy()
+    evolution = args.get('evolutionFilter', '')
+    if evolution:
+        mask &= (_column(df, 'variación', '') == evolution).to_numpy()
+
+    search = args.get('search[value]', '').strip().lower()
+    if search:
+        haystack = pd.Series('', index=df.index)
+        for column in RESULT_SEARCH_COLUMNS:
+            haystack = haystack + ' ' + _column(df, column, '').fillna('').astype(str).str.lower()
+        # DataTables smart search: every word has to appear somewhere in the row
+        for word in search.split():
+            mask &= haystack.str.contains(word, regex=False).to_numpy()
+    return df[mask]
+
+# Request arguments that select the filtered subset the charts describe
+STATS_FILTER_ARGS = ['minPrice', 'maxPrice', 'minYear', 'maxYear', 'minKm', 'maxKm', 'locationFilter',
+                     'evolutionFilter', 'search[value]']
+STATS_HISTOGRAM_BINS = 15
+
+def _round_half_up(value):
+    return int(math.floor(value + 0.5))
+
+def histogram(values, bins=STATS_HISTOGRAM_BINS):
+    """Equal-width bins between the min and max value, labelled 'start - end'."""
+    if values.size == 0:
+        return {'labels': [], 'counts': []}
+    low, high = values.min(), values.max()
+    if low == high:
+        return {'labels': [str(_round_half_up(low))], 'counts': [int(values.size)]}
+    counts, edges = np.histogram(values, bins=bins, range=(low, high))
+    labels = [f"{_round_half_up(start)} - {_round_half_up(end)}" for start, end in zip(edges[:-1], edges[1:])]
+    return {'labels': labels, 'counts': counts.tolist()}
+
+def compute_result_stats(df):
+    """
+    Binned chart data for a filtered result frame: price and km histograms, year and top-10
+    location counts, the variation breakdown and an evenly sampled price/year scatter.
+    """
+    price = pd.to_numeric(_column(df, 'normalized_price', 0), errors='coerce').fillna(0).to_numpy(dtype=float)
+    year = pd.to_numeric(_column(df, 'year_num', 0), errors='coerce').fillna(0).to_numpy(dtype=int)
+    km = pd.to_numeric(_column(df, 'kilometers_num', 0), errors='coerce').fillna(0).to_numpy(dtype=float)
+    evolution = _column(df, 'variación', '').fillna('').astype(str).to_numpy()
+    locations = _column(df, 'location', '').fillna('').astype(str)
+
+    years, year_counts = np.unique(year[year > 0], return_counts=True)
+    top_locations = locations[locations != ''].value_counts().head(10)
+    up, down = int((evolution == '↑').sum()), int((evolution == '↓').sum())
+
+    scatter = np.flatnonzero((price > 0) & (year > 0))
+    if scatter.size > stats_scatter_max_points:
+        scatter = scatter[np.linspace(0, scatter.size - 1, stats_scatter_max_points).astype(int)]
+    return {
+        'count': len(df),
+        'price': histogram(price[price > 0]),
+        'km': histogram(km),
+        'year': {'labels': years.astype(str).tolist(), 'counts': year_counts.tolist()},
+        'location': {'labels': top_locations.index.tolist(), 'counts': top_locations.tolist()},
+        'evolution': {'up': up, 'down': down, 'equal': len(evolution) - up - down},
+        'scatter': [{'x': int(year[i]), 'y': round(float(price[i]), 2)} for i in scatter],
+    }
+
+@functools.lru_cache(maxsize=stats_cache_size)
+def cached_result_stats(result_id, filters):
+    """
+    Stats of one cached result frame under one filter set. A result id already pins the search
+    term, exchange rate and target currency, so together with the filters it is the whole key.
+    Raises KeyError when the result frame has expired; errors are not cached.
+    """
+    df = results_cache.get(result_id)
+    if df is None:
+        raise KeyError(result_id)
+    return compute_result_stats(filter_results(df, dict(filters)))
+
+def render_page(template_name, **context):
+    """render_template, timed into metrics.template_render_seconds."""
+    started = time.perf_counter()
+    body = render_template(template_name, **context)
+    metrics.template_render_seconds.labels(template_name).observe(time.perf_counter() - started)
+    return body
+
+def render_results(df, search_term, exchange_rate, target_currency, search_terms, logs=None, log_stream_url=None):
+    """
+    Post-processes a result frame for display (currency, variation) and renders the results page.
+    Logs default to the current request's buffer; pass log_stream_url to tail them over SSE instead.
+    """
     sort = request.args.get('sort', '')
     order = request.args.get('order', 'asc')
-    search_terms = sorted(set(doc['search_term'] for doc in cars_collection.find({}, {'search_term': 1})))
+    try:
+        exchange_rate_val = float(exchange_rate) if exchange_rate else 0
+    except ValueError:
+        exchange_rate_val = 0
+
+    df = df.copy()
+
+    # Post-process DataFrame to ensure currency and correct price formatting
+    # This handles both new scrapes (which already have it) and historical data (which might not)
+    price_num = df['price_num'] if 'price_num' in df.columns else pd.Series(0, index=df.index)
+    df['currency'], df['price'], df['normalized_price'] = convert_prices(price_num, exchange_rate_val, target_currency)
+    df['variación'] = compute_price_variations(df)
+
+    if 'image' not in df.columns:
+        df['image'] = ""
+
+    # Explicit column order is not strictly necessary here because we will use explicit columns in HTML
+    # But we can keep it clean if we want
+    if sort and sort in df.columns:
+        df = df.sort_values(by=sort, ascending=(order == 'asc'))
+    #csv_filename = f"mercado_libre_{search_term.replace(' ', '_')}.csv"
+    #df.to_csv(csv_filename, index=False)
+    result_id = results_cache.put(df)
+    return render_page('results.html', logs=web_logger.logs if logs is None else logs, log_stream_url=log_stream_url,
+                       result_id=result_id, total_items=len(df), search_terms=search_terms, search_term=search_term,
+                       exchange_rate=exchange_rate, target_currency=target_currency)
+
+# Pages are rendered from templates/; compiling them here keeps the first request from paying for it
+PAGE_TEMPLATES = ['index.html', 'results.html']
+for template_name in PAGE_TEMPLATES:
+    app.jinja_env.get_template(template_name)
+
+COMPRESSIBLE_MIMETYPES = {'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript',
+                          'application/javascript', 'application/json'}
+# Offered in order of preference
+RESPONSE_ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=response_brotli_quality)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=response_gzip_level, mtime=0)
+
+@app.before_request
+def bind_request_log():
+    # Each request logs into its own buffer; pooled server threads would otherwise share one
+    web_logger.bind(web_logger.new_buffer())
+
+@app.after_request
+def finalize_response(response):
+    """
+    Adds a weak ETag to buffered GET responses and answers If-None-Match with 304, then
+    compresses text bodies with the best encoding the client accepts. Streamed responses
+    (exports, log streams) and files sent by Flask are left untouched.
+    """
+    if response.direct_passthrough or response.is_streamed or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    if request.method == 'GET' and response.status_code == 200:
+        # Weak, because the identity and compressed bodies share it
+        response.add_etag(weak=True)
+        response.make_conditional(request)
+    if not response_compression or response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = request.accept_encodings.best_match(RESPONSE_ENCODINGS)
+    if len(body) < response_compression_min_bytes or encoding is None:
+        return response
+    response.set_data(compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+@app.route('/', methods=['GET', 'POST'])
+def index():
+    search_terms = search_term_registry.terms()
     search_term = ""
     exchange_rate = ""
     target_currency = "USD"
@@ -373,782 +2440,574 @@ def index():
         exchange_rate = request.form.get('exchange_rate', '')
         target_currency = request.form.get('target_currency', 'USD')
 
-        try:
-            exchange_rate_val = float(exchange_rate) if exchange_rate else 0
-        except ValueError:
-            exchange_rate_val = 0
-
         action = request.form.get('action', 'scrape')
-        web_logger.logs = []  # Clear previous logs
+        incremental = request.form.get('incremental') == '1'
 
         if action == 'history':
             df = get_historical_data(search_term)
         elif action == 'scrape_all':
-            all_dfs = []
-            for term in search_terms:
-                web_logger.write(f"Iniciando scrape masivo para: {term}")
-                try:
-                    d = scrape_mercado_libre(term)
-                    if not d.empty:
-                        all_dfs.append(d)
-                except Exception as e:
-                    web_logger.write(f"Error scraping {term}: {e}")
+            all_dfs = [d for d in scrape_all_terms(search_terms, incremental).values() if not d.empty]
             if all_dfs:
                 df = pd.concat(all_dfs, ignore_index=True)
             else:
                 df = pd.DataFrame()
             search_term = "Todos (Batch)"
         else:
-            df = scrape_mercado_libre(search_term)
-
-        # Post-process DataFrame to ensure currency and correct price formatting
-        # This handles both new scrapes (which already have it) and historical data (which might not)
-        variation_list = []
-        currencies = []
-        formatted_prices = []
-        normalized_prices = []
-
-        for _, row in df.iterrows():
-            # Original Currency detection
-            p_num = row.get('price_num', 0)
-            src_curr, _ = determine_currency_and_format(p_num)
-
-            # Conversion Logic
-            final_price_val = p_num
-            final_curr = src_curr
-
-            if exchange_rate_val > 0:
-                if target_currency == 'USD' and src_curr == 'ARS':
-                    final_price_val = p_num / exchange_rate_val
-                    final_curr = 'USD'
-                elif target_currency == 'ARS' and src_curr == 'USD':
-                    final_price_val = p_num * exchange_rate_val
-                    final_curr = 'ARS'
-                elif target_currency == src_curr:
-                    final_curr = target_currency
-            else:
-                 # If no exchange rate, we can't convert, but user requested target_currency.
-                 # Current logic: default to original.
-                 # Or should we try to respect the target currency request if possible (e.g. they match)?
-                 if target_currency == src_curr:
-                     final_curr = target_currency
-
-            # Format the final price
-            if final_curr == 'ARS':
-                formatted_num = f"{final_price_val:,.0f}".replace(',', '.')
-                p_fmt = f"$ {formatted_num}"
-            else:
-                formatted_num = f"{final_price_val:,.0f}".replace(',', '.')
-                p_fmt = f"US$ {formatted_num}"
-
-            currencies.append(final_curr)
-            formatted_prices.append(p_fmt)
-
-            # Normalized price (for sorting) should align with the displayed currency
-            normalized_prices.append(final_price_val)
-
-            # Variation logic
-            current_date_str = row.get('date_str', datetime.utcnow().strftime('%Y-%m-%d'))
-            prev_doc = cars_collection.find_one({
-                'unique_id': row['unique_id'],
-                'search_term': row['search_term'],
-                'date_str': {'$lt': current_date_str}
-            }, sort=[('date_str', -1)])
-            prev_price = prev_doc['price_num'] if prev_doc else None
-            curr_price = row['price_num']
-            if prev_price is None:
-                variation = ''
-            elif curr_price > prev_price:
-                variation = '↑'
-            elif curr_price < prev_price:
-                variation = '↓'
-            else:
-                variation = '='
-            variation_list.append(variation)
-
-        df['currency'] = currencies
-        df['price'] = formatted_prices
-        df['variación'] = variation_list
-        df['normalized_price'] = normalized_prices
-
-        if 'image' not in df.columns:
-            df['image'] = ""
-
-        # Explicit column order is not strictly necessary here because we will use explicit columns in HTML
-        # But we can keep it clean if we want
-        if sort and sort in df.columns:
-            df = df.sort_values(by=sort, ascending=(order == 'asc'))
-        #csv_filename = f"mercado_libre_{search_term.replace(' ', '_')}.csv"
-        #df.to_csv(csv_filename, index=False)
-        return render_template_string('''
-        <!DOCTYPE html>
-        <html lang="es">
-        <head>
-            <title>Mercado Libre Scraper</title>
-            <!-- Bootstrap 5 CSS -->
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css" rel="stylesheet">
-            <!-- DataTables Bootstrap 5 -->
-            <link href="https://cdn.datatables.net/1.13.7/css/dataTables.bootstrap5.min.css" rel="stylesheet">
-            <style>
-                body { background: #f6f7fa; }
-                .container { max-width: 1300px; margin-top: 35px; }
-                .table img.product-thumb { width:100px; height:100px; object-fit:cover; border-radius:8px; }
-                .evol-btn { padding: 3px 12px; font-size: 0.95em; }
-                .modal-content { border-radius: 16px; }
-                .form-label { margin-bottom: 0.3em; }
-                .card { box-shadow: 0 3px 10px rgba(0,0,0,0.09);}
-                .table thead th { background: #33416c; color: #fff; }
-            </style>
-        </head>
-        <body>
-        <div class="container">
-            <h1 class="mb-3 display-5 fw-bold text-primary">Mercado Libre Scraper</h1>
-            <div class="card shadow-sm mb-4">
-                <div class="card-body">
-                    <form method="POST" id="searchForm" class="row g-3 align-items-end">
-                        <div class="col-md-4">
-                            <label for="searchInput" class="form-label">Término a buscar</label>
-                            <input type="text" name="search_term" id="searchInput" class="form-control" placeholder="Ejemplo: BMW X3" value="{{ search_term }}">
-                        </div>
-                        <div class="col-md-4">
-                            <label for="dropdown_search_term" class="form-label">Búsquedas anteriores</label>
-                            <select name="dropdown_search_term" id="dropdown_search_term" class="form-select" onchange="onDropdownChange(this)">
-                                <option value="">-- Seleccione búsqueda anterior --</option>
-                                {% for term in search_terms %}
-                                    <option value="{{ term }}" {% if term == search_term %}selected{% endif %}>{{ term }}</option>
-                                {% endfor %}
-                            </select>
-                        </div>
-                        <div class="col-md-2">
-                            <label for="exchangeRate" class="form-label">Tipo de Cambio</label>
-                            <input type="number" step="0.01" name="exchange_rate" id="exchangeRate" class="form-control" placeholder="ARS/USD" value="{{ exchange_rate }}">
-                        </div>
-                        <div class="col-md-2">
-                            <label for="targetCurrency" class="form-label">Moneda Base</label>
-                            <select name="target_currency" id="targetCurrency" class="form-select">
-                                <option value="USD" {% if target_currency == 'USD' %}selected{% endif %}>USD</option>
-                                <option value="ARS" {% if target_currency == 'ARS' %}selected{% endif %}>ARS</option>
-                            </select>
-                        </div>
-                        <div class="col-md-2 d-grid gap-2">
-                            <button type="submit" name="action" value="scrape" class="btn btn-success fw-semibold">Scrapear</button>
-                            <button type="submit" name="action" value="scrape_all" class="btn btn-warning fw-semibold">Scrapear Todos</button>
-                            <button type="submit" name="action" value="history" class="btn btn-secondary fw-semibold">Ver Histórico</button>
-                        </div>
-                    </form>
-                </div>
-            </div>
-
-            <!-- Tabs Navigation -->
-            <ul class="nav nav-tabs mb-3" id="myTab" role="tablist">
-                <li class="nav-item" role="presentation">
-                    <button class="nav-link active" id="results-tab" data-bs-toggle="tab" data-bs-target="#results-tab-pane" type="button" role="tab" aria-controls="results-tab-pane" aria-selected="true">Resultados</button>
-                </li>
-                <li class="nav-item" role="presentation">
-                    <button class="nav-link" id="charts-tab" data-bs-toggle="tab" data-bs-target="#charts-tab-pane" type="button" role="tab" aria-controls="charts-tab-pane" aria-selected="false">Gráficos</button>
-                </li>
-                <li class="nav-item" role="presentation">
-                    <button class="nav-link" id="logs-tab" data-bs-toggle="tab" data-bs-target="#logs-tab-pane" type="button" role="tab" aria-controls="logs-tab-pane" aria-selected="false">Logs del Scraper</button>
-                </li>
-            </ul>
-
-            <div class="tab-content" id="myTabContent">
-                <!-- Results Pane -->
-                <div class="tab-pane fade show active" id="results-tab-pane" role="tabpanel" aria-labelledby="results-tab" tabindex="0">
-
-                    <!-- Filter Card -->
-                    <div class="card shadow-sm mb-4">
-                <div class="card-header bg-light py-2 d-flex justify-content-between align-items-center">
-                    <h5 class="mb-0 h6 fw-bold text-primary">Filtros de resultados</h5>
-                    <button type="button" id="resetFilters" class="btn btn-outline-danger btn-sm" style="font-size: 0.8em; padding: 2px 8px;">Reset</button>
-                </div>
-                <div class="card-body py-2">
-                    <div class="row g-2">
-                        <!-- Price Filter -->
-                        <div class="col-md-3">
-                            <label class="form-label small fw-semibold text-secondary mb-1">Precio (Normalizado)</label>
-                            <div class="input-group input-group-sm">
-                                <input type="number" id="minPrice" class="form-control" placeholder="Min">
-                                <span class="input-group-text px-1">-</span>
-                                <input type="number" id="maxPrice" class="form-control" placeholder="Max">
-                            </div>
-                        </div>
-                        <!-- Year Filter -->
-                        <div class="col-md-2">
-                            <label class="form-label small fw-semibold text-secondary mb-1">Año</label>
-                            <div class="input-group input-group-sm">
-                                <input type="number" id="minYear" class="form-control" placeholder="Min">
-                                <span class="input-group-text px-1">-</span>
-                                <input type="number" id="maxYear" class="form-control" placeholder="Max">
-                            </div>
-                        </div>
-                        <!-- Km Filter -->
-                        <div class="col-md-3">
-                            <label class="form-label small fw-semibold text-secondary mb-1">Kilómetros</label>
-                            <div class="input-group input-group-sm">
-                                <input type="number" id="minKm" class="form-control" placeholder="Min">
-                                <span class="input-group-text px-1">-</span>
-                                <input type="number" id="maxKm" class="form-control" placeholder="Max">
-                            </div>
-                        </div>
-                        <!-- Location Filter -->
-                        <div class="col-md-2">
-                            <label class="form-label small fw-semibold text-secondary mb-1">Ubicación</label>
-                            <input type="text" id="locationFilter" class="form-control form-control-sm" placeholder="Buscar...">
-                        </div>
-                        <!-- Evolution Filter -->
-                        <div class="col-md-2">
-                            <label class="form-label small fw-semibold text-secondary mb-1">Evolución</label>
-                            <select id="evolutionFilter" class="form-select form-select-sm">
-                                <option value="">Todos</option>
-                                <option value="↑">Ascendente (↑)</option>
-                                <option value="↓">Descendente (↓)</option>
-                                <option value="=">Igual (=)</option>
-                            </select>
-                        </div>
-                    </div>
-                </div>
-            </div>
-
-            <div class="bg-white rounded p-3 shadow-sm mb-4">
-                <h2 class="mb-3 h4">Resultados <span class="text-secondary small">({{ df|length }} ítems)</span></h2>
-                <div class="table-responsive">
-                    <table id="resultsTable" class="table table-striped table-hover align-middle">
-                        <thead>
-                            <tr>
-                                <th>Imagen</th>
-                                <th>Descripción</th>
-                                <th>Precio</th>
-                                <th>Moneda</th>
-                                <th>Año</th>
-                                <th>Km</th>
-                                <th>Ubicación</th>
-                                <th>Enlace</th>
-                                <th>Evolución</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                            {% for _, row in df.iterrows() %}
-                            <tr data-evolution="{{ row.variación }}">
-                                <td>
-                                    {% if row.image %}
-                                        <img src="{{ row.image }}" class="product-thumb" loading="lazy">
-                                    {% else %}
-                                        <span class="text-secondary">N/A</span>
-                                    {% endif %}
-                                </td>
-                                <td>{{ row.description }}</td>
-                                <td data-order="{{ row.normalized_price }}">{{ row.price }}</td>
-                                <td>{{ row.currency }}</td>
-                                <td data-order="{{ row.year_num }}">{{ row.year }}</td>
-                                <td data-order="{{ row.kilometers_num }}">{{ row.kilometers }}</td>
-                                <td>{{ row.location }}</td>
-                                <td>
-                                    {% if row.link %}
-                                    <a href="{{ row.link }}" class="btn btn-outline-primary btn-sm fw-semibold" target="_blank">
-                                        Ver producto
-                                    </a>
-                                    {% else %}
-                                    <span class="text-secondary">N/A</span>
-                                    {% endif %}
-                                </td>
-                                <td>
-                                    <span class="badge bg-light text-dark border me-1">{{ row.variación }}</span>
-                                    <button type="button" class="btn btn-outline-secondary btn-sm evol-btn show-history"
-                                            data-uniqueid="{{ row.unique_id }}"
-                                            data-searchterm="{{ row.search_term }}">
-                                        Ver
-                                    </button>
-                                </td>
-                            </tr>
-                            {% endfor %}
-                        </tbody>
-                    </table>
-                </div>
-            </div>
-                </div> <!-- End Results Pane -->
-
-                <!-- Charts Pane -->
-                <div class="tab-pane fade" id="charts-tab-pane" role="tabpanel" aria-labelledby="charts-tab" tabindex="0">
-                    <div class="container-fluid p-0">
-                        <div class="row g-3 mb-4">
-                            <!-- Scatter: Price vs Year -->
-                            <div class="col-12 col-lg-8">
-                                <div class="card shadow-sm h-100">
-                                    <div class="card-header bg-white py-2"><h6 class="m-0 fw-bold text-primary">Precio vs Año</h6></div>
-                                    <div class="card-body">
-                                        <canvas id="scatterPriceYearChart" style="max-height: 300px;"></canvas>
-                                    </div>
-                                </div>
-                            </div>
-                            <!-- Evolution -->
-                            <div class="col-12 col-lg-4">
-                                <div class="card shadow-sm h-100">
-                                    <div class="card-header bg-white py-2"><h6 class="m-0 fw-bold text-primary">Evolución de Precios</h6></div>
-                                    <div class="card-body">
-                                        <canvas id="evolutionPieChart" style="max-height: 300px;"></canvas>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                        <div class="row g-3 mb-4">
-                            <!-- Price Distribution -->
-                            <div class="col-12 col-md-4">
-                                <div class="card shadow-sm h-100">
-                                    <div class="card-header bg-white py-2"><h6 class="m-0 fw-bold text-primary">Distribución de Precios</h6></div>
-                                    <div class="card-body">
-                                        <canvas id="priceDistChart" style="max-height: 250px;"></canvas>
-                                    </div>
-                                </div>
-                            </div>
-                            <!-- Year Distribution -->
-                            <div class="col-12 col-md-4">
-                                <div class="card shadow-sm h-100">
-                                    <div class="card-header bg-white py-2"><h6 class="m-0 fw-bold text-primary">Distribución por Año</h6></div>
-                                    <div class="card-body">
-                                        <canvas id="yearDistChart" style="max-height: 250px;"></canvas>
-                                    </div>
-                                </div>
-                            </div>
-                            <!-- Km Distribution -->
-                            <div class="col-12 col-md-4">
-                                <div class="card shadow-sm h-100">
-                                    <div class="card-header bg-white py-2"><h6 class="m-0 fw-bold text-primary">Distribución por Kilometraje</h6></div>
-                                    <div class="card-body">
-                                        <canvas id="kmDistChart" style="max-height: 250px;"></canvas>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                        <div class="row g-3">
-                             <!-- Location -->
-                            <div class="col-12">
-                                <div class="card shadow-sm">
-                                    <div class="card-header bg-white py-2"><h6 class="m-0 fw-bold text-primary">Top Ubicaciones</h6></div>
-                                    <div class="card-body">
-                                        <canvas id="locationBarChart" style="max-height: 300px;"></canvas>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-
-                <!-- Logs Pane -->
-                <div class="tab-pane fade" id="logs-tab-pane" role="tabpanel" aria-labelledby="logs-tab" tabindex="0">
-                    <div class="card shadow-sm mb-4">
-                        <div class="card-header bg-dark text-white py-2">
-                            <h5 class="mb-0 h6 font-monospace">Logs Técnicos</h5>
-                        </div>
-                        <div class="card-body bg-dark text-light p-0">
-                            <div style="max-height: 600px; overflow-y: auto; padding: 1rem;">
-                                <pre class="m-0" style="font-size: 0.85rem; white-space: pre-wrap;">{% for log in logs %}{{ log }}
-{% endfor %}</pre>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div> <!-- End Tab Content -->
-        </div>
-
-        <!-- Modal Bootstrap para gráfico -->
-        <div class="modal fade" id="chartModal" tabindex="-1" aria-labelledby="chartModalLabel" aria-hidden="true">
-          <div class="modal-dialog modal-lg modal-dialog-centered">
-            <div class="modal-content p-2">
-              <div class="modal-header">
-                <h5 class="modal-title" id="chartModalLabel">Evolución histórica del precio promedio</h5>
-                <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Cerrar"></button>
-              </div>
-              <div class="modal-body text-center">
-                <canvas id="priceChart" width="700" height="320"></canvas>
-              </div>
-            </div>
-          </div>
-        </div>
-
-        <!-- Bootstrap & JS -->
-        <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/js/bootstrap.bundle.min.js"></script>
-        <script src="https://code.jquery.com/jquery-3.6.0.min.js"></script>
-        <script src="https://cdn.datatables.net/1.13.7/js/jquery.dataTables.min.js"></script>
-        <script src="https://cdn.datatables.net/1.13.7/js/dataTables.bootstrap5.min.js"></script>
-        <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-        <script>
-        function onDropdownChange(sel) {
-            if(sel.value) {
-                document.getElementById('searchInput').value = sel.value;
-            }
-        }
-        $(document).ready(function() {
-            // Restore filter values from localStorage
-            const filterIds = ['minPrice', 'maxPrice', 'minYear', 'maxYear', 'minKm', 'maxKm', 'locationFilter', 'evolutionFilter'];
-            filterIds.forEach(id => {
-                const storedVal = localStorage.getItem('ml_scraper_' + id);
-                if (storedVal !== null) {
-                    $('#' + id).val(storedVal);
-                }
-            });
-
-            // Custom filtering function which will search data in column four between two values
-            $.fn.dataTable.ext.search.push(
-                function(settings, data, dataIndex, rowData, counter) {
-                    // Normalize inputs
-                    var minPrice = parseFloat($('#minPrice').val()) || 0;
-                    var maxPrice = parseFloat($('#maxPrice').val()) || Infinity;
-                    if ($('#maxPrice').val() === "") maxPrice = Infinity;
-
-                    var minYear = parseInt($('#minYear').val()) || 0;
-                    var maxYear = parseInt($('#maxYear').val()) || Infinity;
-                    if ($('#maxYear').val() === "") maxYear = Infinity;
-
-                    var minKm = parseInt($('#minKm').val()) || 0;
-                    var maxKm = parseInt($('#maxKm').val()) || Infinity;
-                    if ($('#maxKm').val() === "") maxKm = Infinity;
-
-                    var locationTerm = $('#locationFilter').val().toLowerCase();
-                    var evolutionTerm = $('#evolutionFilter').val();
-
-                    // Get row data (using data-order attributes where available via DataTables API usually, but here 'data' array contains rendered text)
-                    // However, we want the raw numeric values for range filtering.
-
-                    var api = new $.fn.dataTable.Api(settings);
-                    var rowNode = api.row(dataIndex).node();
-                    var evolution = $(rowNode).data('evolution') || "";
-
-                    // Filter by Evolution
-                    if (evolutionTerm && evolution !== evolutionTerm) {
-                        return false;
-                    }
-
-                    // Filter by Location (simple text match)
-                    var location = data[6].toLowerCase();
-                    if (locationTerm && !location.includes(locationTerm)) {
-                        return false;
-                    }
-
-                    // Numeric Filters
-                    // Column 2: Price (normalized in data-order)
-                    var priceVal = parseFloat(api.cell(dataIndex, 2).render('sort')) || 0;
-                    if (priceVal < minPrice || priceVal > maxPrice) {
-                        return false;
-                    }
-
-                    // Column 4: Year
-                    var yearVal = parseFloat(api.cell(dataIndex, 4).render('sort')) || 0;
-                    if (yearVal < minYear || yearVal > maxYear) {
-                        return false;
-                    }
-
-                    // Column 5: Km
-                    var kmVal = parseFloat(api.cell(dataIndex, 5).render('sort')) || 0;
-                    if (kmVal < minKm || kmVal > maxKm) {
-                        return false;
-                    }
-
-                    return true;
-                }
-            );
-
-            var table = $('#resultsTable').DataTable({
-                paging: false,
-                info: false,
-                language: {search: "Buscar:", zeroRecords: "No se encontraron registros"}
-            });
-
-            // --- Chart Instances ---
-            let charts = {};
-
-            function initCharts() {
-                // Common options
-                const commonOptions = { responsive: true, maintainAspectRatio: false };
-
-                // Scatter Price vs Year
-                const ctxScatter = document.getElementById('scatterPriceYearChart').getContext('2d');
-                charts.scatter = new Chart(ctxScatter, {
-                    type: 'scatter',
-                    data: { datasets: [{ label: 'Precio vs Año', data: [], backgroundColor: 'rgba(54, 162, 235, 0.6)' }] },
-                    options: { ...commonOptions, scales: { x: { title: { display: true, text: 'Año' } }, y: { title: { display: true, text: 'Precio' } } } }
-                });
-
-                // Evolution Pie
-                const ctxPie = document.getElementById('evolutionPieChart').getContext('2d');
-                charts.pie = new Chart(ctxPie, {
-                    type: 'doughnut',
-                    data: { labels: ['Subió', 'Bajó', 'Igual'], datasets: [{ data: [0,0,0], backgroundColor: ['#ff6384', '#36a2eb', '#ffce56'] }] },
-                    options: commonOptions
-                });
-
-                // Price Dist
-                const ctxPrice = document.getElementById('priceDistChart').getContext('2d');
-                charts.price = new Chart(ctxPrice, {
-                    type: 'bar',
-                    data: { labels: [], datasets: [{ label: 'Frecuencia', data: [], backgroundColor: 'rgba(75, 192, 192, 0.6)' }] },
-                    options: { ...commonOptions, scales: { x: { ticks: { maxTicksLimit: 10 } } } }
-                });
-
-                // Year Dist
-                const ctxYear = document.getElementById('yearDistChart').getContext('2d');
-                charts.year = new Chart(ctxYear, {
-                    type: 'bar',
-                    data: { labels: [], datasets: [{ label: 'Cantidad', data: [], backgroundColor: 'rgba(153, 102, 255, 0.6)' }] },
-                    options: commonOptions
-                });
-
-                // Km Dist
-                const ctxKm = document.getElementById('kmDistChart').getContext('2d');
-                charts.km = new Chart(ctxKm, {
-                    type: 'bar',
-                    data: { labels: [], datasets: [{ label: 'Frecuencia', data: [], backgroundColor: 'rgba(255, 159, 64, 0.6)' }] },
-                    options: { ...commonOptions, scales: { x: { ticks: { maxTicksLimit: 10 } } } }
-                });
-
-                // Location Bar
-                const ctxLoc = document.getElementById('locationBarChart').getContext('2d');
-                charts.location = new Chart(ctxLoc, {
-                    type: 'bar',
-                    data: { labels: [], datasets: [{ label: 'Cantidad', data: [], backgroundColor: 'rgba(255, 99, 132, 0.6)' }] },
-                    options: { ...commonOptions, indexAxis: 'y' }
-                });
-            }
+            df = scrape_mercado_libre(search_term, incremental=incremental)
 
-            function updateDashboard() {
-                const rows = table.rows({ search: 'applied' }).nodes();
-                const $rows = $(rows);
-
-                const prices = [];
-                const years = [];
-                const kms = [];
-                const locations = [];
-                const evolutions = { up: 0, down: 0, equal: 0 };
-                const scatterData = [];
-
-                $rows.each(function() {
-                    const $row = $(this);
-                    // Col 2: Price
-                    const price = parseFloat($row.find('td:eq(2)').attr('data-order')) || 0;
-                    // Col 4: Year
-                    const year = parseInt($row.find('td:eq(4)').attr('data-order')) || 0;
-                    // Col 5: Km
-                    const km = parseFloat($row.find('td:eq(5)').attr('data-order')) || 0;
-                    // Col 6: Location
-                    const loc = $row.find('td:eq(6)').text().trim();
-                    // Evolution (TR attribute)
-                    const evol = $row.attr('data-evolution');
-
-                    if(price > 0) prices.push(price);
-                    if(year > 0) years.push(year);
-                    kms.push(km);
-                    if(loc) locations.push(loc);
-
-                    if (evol === '↑') evolutions.up++;
-                    else if (evol === '↓') evolutions.down++;
-                    else evolutions.equal++;
-
-                    if (price > 0 && year > 0) {
-                        scatterData.push({ x: year, y: price });
-                    }
-                });
-
-                // Update Scatter
-                charts.scatter.data.datasets[0].data = scatterData;
-                charts.scatter.update();
-
-                // Update Evolution Pie
-                charts.pie.data.datasets[0].data = [evolutions.up, evolutions.down, evolutions.equal];
-                charts.pie.update();
-
-                // Helper for Histogram
-                function createHistogram(dataArray, numBins) {
-                    if (dataArray.length === 0) return { labels: [], counts: [] };
-                    const min = Math.min(...dataArray);
-                    const max = Math.max(...dataArray);
-                    if (min === max) return { labels: [min], counts: [dataArray.length] };
-
-                    const step = (max - min) / numBins;
-                    const bins = new Array(numBins).fill(0);
-                    const labels = [];
-
-                    for(let i=0; i<numBins; i++) {
-                        const start = min + (i * step);
-                        const end = start + step;
-                        labels.push(`${Math.round(start)} - ${Math.round(end)}`);
-                    }
-
-                    dataArray.forEach(val => {
-                        let idx = Math.floor((val - min) / step);
-                        if (idx >= numBins) idx = numBins - 1;
-                        bins[idx]++;
-                    });
-
-                    return { labels, counts: bins };
-                }
-
-                // Update Price Dist
-                const priceHist = createHistogram(prices, 15);
-                charts.price.data.labels = priceHist.labels;
-                charts.price.data.datasets[0].data = priceHist.counts;
-                charts.price.update();
-
-                // Update Year Dist
-                const yearCounts = {};
-                years.forEach(y => yearCounts[y] = (yearCounts[y] || 0) + 1);
-                const sortedYears = Object.keys(yearCounts).sort();
-                charts.year.data.labels = sortedYears;
-                charts.year.data.datasets[0].data = sortedYears.map(y => yearCounts[y]);
-                charts.year.update();
-
-                // Update Km Dist
-                const kmHist = createHistogram(kms, 15);
-                charts.km.data.labels = kmHist.labels;
-                charts.km.data.datasets[0].data = kmHist.counts;
-                charts.km.update();
-
-                // Update Location (Top 10)
-                const locCounts = {};
-                locations.forEach(l => locCounts[l] = (locCounts[l] || 0) + 1);
-                const sortedLocs = Object.entries(locCounts).sort((a,b) => b[1] - a[1]).slice(0, 10);
-                charts.location.data.labels = sortedLocs.map(i => i[0]);
-                charts.location.data.datasets[0].data = sortedLocs.map(i => i[1]);
-                charts.location.update();
-            }
-
-            // Init and Draw
-            initCharts();
-            updateDashboard();
-
-            // Hook into draw event
-            table.on('draw', function () {
-                updateDashboard();
-            });
-
-            // Event listeners for inputs to redraw table and save to localStorage
-            $('#minPrice, #maxPrice, #minYear, #maxYear, #minKm, #maxKm, #locationFilter, #evolutionFilter').on('keyup change', function() {
-                localStorage.setItem('ml_scraper_' + this.id, $(this).val());
-                table.draw();
-            });
-
-            // Reset filters button
-            $('#resetFilters').on('click', function() {
-                const filterIds = ['minPrice', 'maxPrice', 'minYear', 'maxYear', 'minKm', 'maxKm', 'locationFilter', 'evolutionFilter'];
-                filterIds.forEach(id => {
-                    localStorage.removeItem('ml_scraper_' + id);
-                    $('#' + id).val('');
-                });
-                table.draw();
-            });
-
-        });
-
-        // Modal gráfico evolución con Bootstrap
-        let chart = null;
-        let chartModal = new bootstrap.Modal(document.getElementById('chartModal'));
-        function updateChart(history) {
-            const labels = history.map(point => point.date);
-            const data = history.map(point => point.avg_price);
-            if(chart) { chart.destroy(); }
-            chart = new Chart(document.getElementById('priceChart').getContext('2d'), {
-                type: 'line',
-                data: { labels: labels, datasets: [{ label: 'Precio promedio (USD)', data: data, fill: false, borderColor: 'rgb(75, 192, 192)', tension: 0.1 }] },
-                options: { responsive: true, maintainAspectRatio: false, scales: { x: { display: true, title: { display: true, text: 'Fecha' }}, y: { display: true, title: { display: true, text: 'Precio USD'}}}}
-            });
-        }
-        $(document).on('click', '.show-history', function() {
-            const unique_id = $(this).data('uniqueid');
-            const search_term = $(this).data('searchterm');
-            fetch('/history', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({unique_id, search_term})
-            })
-            .then(response => response.json())
-            .then(result => {
-                updateChart(result.history);
-                chartModal.show();
-            });
-        });
-
-        // Logging en consola
-        {% if logs %}
-            {% for log in logs %}
-                console.log("[SCRAPER]", `{{ log|e }}`);
-            {% endfor %}
-        {% endif %}
-        </script>
-        </body>
-        </html>
-        ''', logs=web_logger.logs, df=df, search_terms=search_terms, search_term=search_term, exchange_rate=exchange_rate, target_currency=target_currency)
+        return render_results(df, search_term, exchange_rate, target_currency, search_terms)
 
     # GET (página inicial)
-    return render_template_string('''
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Mercado Libre Scraper</title>
-            <link rel="stylesheet" type="text/css" href="https://cdn.datatables.net/1.11.5/css/jquery.dataTables.min.css">
-            <link rel="stylesheet" type="text/css" href="https://cdn.datatables.net/buttons/2.2.2/css/buttons.dataTables.min.css">
-<style>
-    :root { --bg-dark: #1a1a1a; --text-light: #e0e0e0; --primary-accent: #4a6fa5; --secondary-accent: #6d8bc7; --table-border: #3a3a3a; }
-    body { font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; margin: 20px; background-color: var(--bg-dark); color: var(--text-light); }
-    h1, h2, h3 { color: var(--primary-accent); }
-</style>
-        </head>
-        <body>
-            <h1>Mercado Libre Scraper</h1>
-            <form method="POST" id="searchForm">
-                <input type="text" name="search_term" id="searchInput" placeholder="Enter search term">
-                <select name="dropdown_search_term" id="dropdown_search_term" onchange="onDropdownChange(this)">
-                    <option value="">-- Seleccione búsqueda anterior --</option>
-                    {% for term in search_terms %}
-                        <option value="{{ term }}">{{ term }}</option>
-                    {% endfor %}
-                </select>
-                <input type="number" step="0.01" name="exchange_rate" placeholder="Tipo de cambio (ARS/USD)">
-                <select name="target_currency">
-                    <option value="USD" selected>USD</option>
-                    <option value="ARS">ARS</option>
-                </select>
-                <button type="submit" name="action" value="scrape">Scrape</button>
-                <button type="submit" name="action" value="scrape_all">Scrapear Todos</button>
-                <button type="submit" name="action" value="history">Ver Histórico</button>
-            </form>
-            <script>
-            function onDropdownChange(sel) {
-                if(sel.value) {
-                    document.getElementById('searchInput').value = sel.value;
-                }
-            }
-            </script>
-            <script>
-                {% if logs %}
-                    {% for log in logs %}
-                        console.log("[SCRAPER]", `{{ log|e }}`);
-                    {% endfor %}
-                {% endif %}
-            </script>
-        </body>
-        </html>
-    ''', logs=web_logger.logs, search_terms=search_terms)
+    return render_page('index.html', logs=web_logger.logs, search_terms=search_terms)
+
+def get_price_series(unique_ids):
+    """
+    Returns {unique_id: [{'date', 'avg_price'}, ...]} for every listing, oldest date first.
+    The series is built in a single aggregation matched on _id, so only the price maps leave
+    the server; listings without prices are left out.
+    """
+    pipeline = [
+        {"$match": {"_id": {"$in": list(unique_ids)}}},
+        {"$project": {"prices": {"$objectToArray": "$prices"}}},
+        {"$unwind": "$prices"},
+        {"$match": {"prices.v": {"$gt": 0}}},
+        {"$sort": {"_id": 1, "prices.k": 1}},
+        {"$group": {"_id": "$_id", "history": {"$push": {"date": "$prices.k", "avg_price": "$prices.v"}}}},
+    ]
+    return {doc['_id']: doc['history'] for doc in price_history_collection.aggregate(pipeline)}
 
 @app.route('/history', methods=['POST'])
 def history():
     data = request.json
     unique_id = str(data.get('unique_id')).strip()
-    search_term = data['search_term']
-    docs = list(cars_collection.find({
-        'unique_id': unique_id,
-        'search_term': search_term
-    }))
-    history_points = {}
+    # The UI also sends search_term, but a listing's prices do not depend on it
+    return jsonify({'history': get_price_series([unique_id]).get(unique_id, [])})
+
+@app.route('/history/batch', methods=['POST'])
+def history_batch():
+    """
+    Price series of many listings in one response, for comparison charts and exports.
+    Accepts {"unique_ids": [...]}; ?format=csv returns one unique_id,date,avg_price row per point.
+    """
+    data = request.get_json(silent=True) or {}
+    unique_ids = list(dict.fromkeys(str(uid).strip() for uid in data.get('unique_ids', []) if str(uid).strip()))
+    if not unique_ids:
+        return jsonify({'error': 'unique_ids is required'}), 400
+    if len(unique_ids) > history_batch_max:
+        return jsonify({'error': f'At most {history_batch_max} unique_ids per request'}), 400
+    series = get_price_series(unique_ids)
+    if request.args.get('format') == 'csv':
+        rows = [{'unique_id': uid, **point} for uid in unique_ids for point in series.get(uid, [])]
+        csv = pd.DataFrame(rows, columns=['unique_id', 'date', 'avg_price']).to_csv(index=False)
+        return Response(csv, mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=price_history.csv'})
+    return jsonify({'history': {uid: series.get(uid, []) for uid in unique_ids}})
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    data = request.get_json(silent=True) or request.form
+    action = data.get('action', 'scrape')
+    incremental = str(data.get('incremental', '')).lower() in ('1', 'true', 'on')
+    if action == 'scrape_all':
+        job, deduplicated = job_manager.submit('scrape_all', search_term_registry.terms(), incremental)
+    else:
+        search_term = (data.get('search_term') or data.get('dropdown_search_term') or "").strip()
+        if not search_term:
+            return jsonify({'error': "Ingrese un término de búsqueda."}), 400
+        job, deduplicated = job_manager.submit('scrape', [search_term], incremental)
+    return jsonify({**job.to_dict(), 'deduplicated': deduplicated}), 202
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/results')
+def job_results(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': "Job not found"}), 404
+    if job.status != 'done':
+        return jsonify(job.to_dict()), 409
+    if job.df is None:
+        return jsonify({'error': "Job results expired"}), 404
+    search_term = "Todos (Batch)" if job.kind == 'scrape_all' else job.search_terms[0]
+    search_terms = search_term_registry.terms()
+    return render_results(job.df, search_term, request.args.get('exchange_rate', ''),
+                          request.args.get('target_currency', 'USD'), search_terms,
+                          logs=[], log_stream_url=url_for('job_logs', job_id=job.id))
+
+@app.route('/jobs/<job_id>/logs')
+def job_logs(job_id):
+    """Tails a job's log buffer as Server-Sent Events until the job finishes."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': "Job not found"}), 404
+    last_seq = request.headers.get('Last-Event-ID') or request.args.get('since') or '0'
+    last_seq = int(last_seq) if last_seq.isdigit() else 0
+
+    def stream(seq):
+        while True:
+            for seq, line in job.logs.since(seq):
+                data = "\n".join(f"data: {part}" for part in line.splitlines())
+                yield f"id: {seq}\n{data}\n\n"
+            if job.logs.closed and not job.logs.since(seq):
+                yield f"event: end\ndata: {job.status}\n\n"
+                return
+            if not job.logs.wait(seq, timeout=15):
+                yield ": keep-alive\n\n"
+
+    return Response(stream(last_seq), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/scrape_all/cancel', methods=['POST'])
+def cancel_scrape_term():
+    search_term = (request.get_json(silent=True) or {}).get('search_term')
+    if not search_term:
+        return jsonify({'error': 'search_term is required'}), 400
+    cancelled = False
+    for engine in list(active_engines):
+        cancelled = engine.cancel(search_term) or cancelled
+    try:
+        request_cancellation(search_term)
+        # Batch jobs of other worker processes stop the term on their next poll
+        cancelled = cancelled or scrape_jobs_collection.count_documents(
+            {'kind': 'scrape_all', 'status': 'running', 'search_terms': search_term}, limit=1) > 0
+    except Exception as e:
+        logger.warning(f"Could not record the cancellation of {search_term}: {e}")
+    return jsonify({'search_term': search_term, 'cancelled': cancelled})
+
+@app.route('/api/search_terms')
+def search_term_metadata():
+    """Registered search terms with their last scrape time, listing count and duration."""
+    return jsonify([{
+        'search_term': entry['_id'],
+        'last_scraped_at': entry['last_scraped_at'].isoformat() if entry.get('last_scraped_at') else None,
+        'listing_count': entry.get('listing_count'),
+        'last_duration_seconds': entry.get('last_duration_seconds'),
+        'scrape_count': entry.get('scrape_count', 0),
+    } for entry in search_term_registry.entries()])
+
+@app.route('/healthz')
+def healthz():
+    """Liveness of the app and the last background MongoDB check; 503 while Mongo is unreachable."""
+    if mongo_health.stale():
+        # Background checks are disabled, have not run yet or stopped running in this process
+        mongo_health.check()
+    mongo = mongo_health.snapshot()
+    healthy = mongo['status'] == 'ok'
+    return jsonify({'status': 'ok' if healthy else 'degraded', 'mongo': mongo}), 200 if healthy else 503
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint; 404 while metrics are disabled."""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.exposition(), content_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+@app.route('/api/rate_limits')
+def rate_limit_metrics():
+    """Per-host state of the adaptive rate limiter."""
+    return jsonify(rate_limiter.metrics())
+
+@app.route('/api/results')
+def api_results():
+    """DataTables server-side processing endpoint for a cached result frame."""
+    args = request.args
+    draw = args.get('draw', 0, type=int)
+    df = results_cache.get(args.get('result_id', ''))
+    if df is None:
+        return jsonify({'draw': draw, 'recordsTotal': 0, 'recordsFiltered': 0, 'data': [],
+                        'error': "Los resultados expiraron, vuelva a realizar la búsqueda."})
+
+    filtered = filter_results(df, args)
+    column_index = args.get('order[0][column]')
+    if column_index is not None and column_index.isdigit() and int(column_index) < len(RESULT_SORT_COLUMNS):
+        sort_column = RESULT_SORT_COLUMNS[int(column_index)]
+        if sort_column and sort_column in filtered.columns:
+            filtered = filtered.sort_values(by=sort_column, ascending=args.get('order[0][dir]', 'asc') == 'asc',
+                                            kind='mergesort')
+
+    start = max(args.get('start', 0, type=int), 0)
+    length = args.get('length', 50, type=int)
+    page = filtered.iloc[start:] if length < 0 else filtered.iloc[start:start + length]
+    page = page.reindex(columns=RESULT_ROW_COLUMNS)
+    rows = page.astype(object).where(page.notna(), None).to_dict(orient='records')
+
+    return jsonify({
+        'draw': draw,
+        'recordsTotal': len(df),
+        'recordsFiltered': len(filtered),
+        'data': rows,
+    })
+
+@app.route('/api/stats')
+def api_stats():
+    """Binned chart data of a cached result frame for the current filter set."""
+    args = request.args
+    filters = tuple((name, args.get(name, '')) for name in STATS_FILTER_ARGS)
+    try:
+        return jsonify(cached_result_stats(args.get('result_id', ''), filters))
+    except KeyError:
+        return jsonify({'error': "Los resultados expiraron, vuelva a realizar la búsqueda."}), 404
+
+# Columns each export can select, with their Parquet types; the first ones are the defaults
+EXPORT_COLUMNS = {
+    'results': {'unique_id': 'string', 'description': 'string', 'price_num': 'int64', 'date_str': 'string',
+                'prev_price_num': 'int64', 'prev_date_str': 'string', 'year': 'string', 'year_num': 'int64',
+                'kilometers': 'string', 'kilometers_num': 'int64', 'location': 'string', 'link': 'string',
+                'image': 'string'},
+    'history': {'unique_id': 'string', 'date_str': 'string', 'price_num': 'int64', 'description': 'string',
+                'year_num': 'int64', 'kilometers_num': 'int64', 'location': 'string', 'link': 'string'},
+}
+EXPORT_DEFAULT_COLUMNS = {
+    'results': ['unique_id', 'description', 'price_num', 'date_str', 'prev_price_num', 'year', 'kilometers',
+                'location', 'link'],
+    'history': ['unique_id', 'date_str', 'price_num', 'description'],
+}
+
+def export_pipeline(dataset, columns, search_term=None, date_from=None, date_to=None):
+    """
+    Aggregation over latest_listings producing one flat document per exported row.
+    'results' is the latest snapshot of every listing; 'history' is one row per listing and day.
+    """
+    dates = {**({'$gte': date_from} if date_from else {}), **({'$lte': date_to} if date_to else {})}
+    pipeline = [{'$match': {'search_terms': search_term}}] if search_term else []
+    if dataset == 'results':
+        if dates:
+            pipeline.append({'$match': {'date_str': dates}})
+        return pipeline + [{'$project': {'_id': 0, **{column: 1 for column in columns}}}]
+
+    attributes = [column for column in columns if column not in ('date_str', 'price_num')]
+    pipeline += [
+        {'$lookup': {'from': price_history_collection.name, 'localField': '_id', 'foreignField': '_id', 'as': 'history'}},
+        {'$unwind': '$history'},
+        {'$project': {'_id': 0, **{column: 1 for column in attributes},
+                      'prices': {'$objectToArray': '$history.prices'}}},
+        {'$unwind': '$prices'},
+    ]
+    if dates:
+        pipeline.append({'$match': {'prices.k': dates}})
+    return pipeline + [{'$project': {
+        **{column: 1 for column in attributes}, 'date_str': '$prices.k', 'price_num': '$prices.v'}}]
+
+def iter_chunks(docs, size):
+    chunk = []
     for doc in docs:
-        date = doc['timestamp'].strftime('%Y-%m-%d') if hasattr(doc['timestamp'], 'strftime') else str(doc['timestamp'])
-        price = doc.get('price_num', 0)
-        if price:
-            history_points.setdefault(date, []).append(price)
-    history_list = [{'date': date, 'avg_price': sum(prices)//len(prices)} for date, prices in sorted(history_points.items())]
-    return jsonify({'history': history_list})
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_csv(docs, columns, chunk_rows=None):
+    """Yields the CSV text of docs a chunk of rows at a time, so memory does not grow with the row count."""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for chunk in iter_chunks(docs, chunk_rows or export_chunk_rows):
+        writer.writerows([doc.get(column) for column in columns] for doc in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+def write_parquet(docs, columns, types, sink, chunk_rows=None):
+    """Writes docs to sink as Parquet, one row group per chunk."""
+    schema = pa.schema([(column, pa.int64() if types[column] == 'int64' else pa.string()) for column in columns])
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in iter_chunks(docs, chunk_rows or export_chunk_rows):
+            writer.write_table(pa.Table.from_pylist(
+                [{column: doc.get(column) for column in columns} for doc in chunk], schema=schema))
+
+def iter_file(file, block_size=1024 * 1024):
+    with file:
+        while block := file.read(block_size):
+            yield block
+
+@app.route('/export/<dataset>.<fmt>')
+def export_data(dataset, fmt):
+    """
+    Streams the stored results or the full price history straight from a Mongo cursor.
+    Query arguments: search_term, from and to (YYYY-MM-DD) and columns (comma separated).
+    """
+    if dataset not in EXPORT_COLUMNS or fmt not in ('csv', 'parquet'):
+        return jsonify({'error': "Use /export/results.<csv|parquet> or /export/history.<csv|parquet>"}), 404
+    if fmt == 'parquet' and pa is None:
+        return jsonify({'error': "Parquet exports require pyarrow"}), 400
+    types = EXPORT_COLUMNS[dataset]
+    columns = [column for column in request.args.get('columns', '').split(',') if column] or EXPORT_DEFAULT_COLUMNS[dataset]
+    unknown = [column for column in columns if column not in types]
+    if unknown:
+        return jsonify({'error': f"Unknown columns: {', '.join(unknown)}", 'columns': list(types)}), 400
+
+    search_term = request.args.get('search_term') or None
+    pipeline = export_pipeline(dataset, columns, search_term, request.args.get('from'), request.args.get('to'))
+    cursor = latest_listings_collection.aggregate(pipeline, allowDiskUse=True, batchSize=export_chunk_rows)
+    filename = f"{dataset}_{re.sub(r'[^0-9A-Za-z_-]+', '_', search_term) if search_term else 'todos'}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if fmt == 'csv':
+        return Response(iter_csv(cursor, columns), mimetype='text/csv', headers=headers)
+    # Parquet writes its footer last, so the file is spooled to disk before streaming it
+    sink = tempfile.TemporaryFile()
+    write_parquet(cursor, columns, types, sink)
+    sink.seek(0)
+    return Response(iter_file(sink), mimetype='application/vnd.apache.parquet', headers=headers)
+
+def summarize_plan(explain):
+    """Reduces an explain() document to its winning plan stages, index names and execution counters."""
+    stages, indexes, stats = [], [], {}
+
+    def walk(node):
+        if isinstance(node, dict):
+            if 'stage' in node:
+                stages.append(node['stage'])
+            if 'indexName' in node:
+                indexes.append(node['indexName'])
+            if 'totalDocsExamined' in node and not stats:
+                stats.update({key: node.get(key) for key in
+                              ('nReturned', 'totalKeysExamined', 'totalDocsExamined', 'executionTimeMillis')})
+            for key, value in node.items():
+                if key not in ('rejectedPlans', 'allPlansExecution'):
+                    walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(explain)
+    return {'stages': stages, 'indexes': indexes, **stats}
+
+def index_report(db=None):
+    """
+    Prints $indexStats usage counters and the explain() plan of every query shape the app runs.
+    """
+    db = mongo_db if db is None else db
+    listings, price_history = db[listings_collection.name], db[price_history_collection.name]
+    latest = db[latest_listings_collection.name]
+    for collection in (listings, price_history, latest):
+        print(f"Index usage for {collection.full_name}:")
+        for stat in collection.aggregate([{"$indexStats": {}}]):
+            print(f"  {stat['name']:40} ops={stat['accesses']['ops']:<10} since={stat['accesses']['since']}")
+
+    sample = latest.find_one({}, sort=[('timestamp', -1)])
+    if not sample:
+        print("No listings stored yet, no query shapes to explain.")
+        return
+    shapes = {
+        'save_listings upsert': (latest, 'find', {'_id': sample['_id']}),
+        'get_historical_data': (latest, 'find', {'search_terms': sample['search_terms'][0]}),
+        'compute_price_variations': (latest, 'find', {'_id': {'$in': [sample['_id']]}}),
+        '/history': (price_history, 'aggregate', [
+            {"$match": {"_id": {"$in": [sample['_id']]}}},
+            {"$project": {"prices": {"$objectToArray": "$prices"}}},
+        ]),
+        'search term dropdown': (db[search_terms_collection.name], 'find', {}),
+        # Fills an empty registry from the stored listings (SearchTermRegistry.backfill)
+        'search term backfill': (latest, 'distinct', 'search_terms'),
+    }
+    print("Query plans:")
+    for name, (collection, kind, query) in shapes.items():
+        if kind == 'find':
+            command = {'find': collection.name, 'filter': query}
+        elif kind == 'aggregate':
+            command = {'aggregate': collection.name, 'pipeline': query, 'cursor': {}}
+        else:
+            command = {'distinct': collection.name, 'key': query}
+        explain = db.command('explain', command, verbosity='executionStats')
+        summary = summarize_plan(explain)
+        print(f"  {name:28} stages={'>'.join(summary['stages'])} indexes={summary['indexes'] or '-'} "
+              f"returned={summary.get('nReturned')} keys={summary.get('totalKeysExamined')} "
+              f"docs={summary.get('totalDocsExamined')} ms={summary.get('executionTimeMillis')}")
+
+def collection_storage(collection):
+    """Document count and data, storage and index sizes in bytes, from $collStats."""
+    try:
+        stats = next(collection.aggregate([{"$collStats": {"storageStats": {}}}]))['storageStats']
+    except (OperationFailure, NotImplementedError, StopIteration) as e:
+        logger.warning(f"Could not read storage stats of {collection.name}: {e}")
+        return {'count': collection.estimated_document_count(), 'size': None, 'storage_size': None, 'index_size': None}
+    return {'count': stats.get('count'), 'size': stats.get('size'),
+            'storage_size': stats.get('storageSize'), 'index_size': stats.get('totalIndexSize')}
+
+def print_storage(label, collections):
+    total = 0
+    for collection in collections:
+        stats = collection_storage(collection)
+        total += (stats['storage_size'] or 0) + (stats['index_size'] or 0)
+        print(f"  {label:7} {collection.name:16} docs={stats['count']:<10} data={stats['size']} "
+              f"storage={stats['storage_size']} indexes={stats['index_size']}")
+    return total
+
+def refresh_latest_listings(batch_size=None):
+    """
+    Rebuilds latest_listings from listings and price_history, for data written by the migration or
+    before the view existed. Scrapes keep it current on their own afterwards.
+    """
+    batch_size = batch_size or mongo_bulk_batch_size
+    pipeline = [
+        {"$project": {"prices": {"$objectToArray": "$prices"}}},
+        {"$unwind": "$prices"},
+        {"$sort": {"prices.k": -1}},
+        {"$group": {"_id": "$_id", "recent": {"$push": "$prices"}}},
+        {"$project": {"recent": {"$slice": ["$recent", 2]}}},
+    ]
+    refreshed = 0
+    cursor = price_history_collection.aggregate(pipeline, allowDiskUse=True)
+    while True:
+        batch = [doc for _, doc in zip(range(batch_size), cursor)]
+        if not batch:
+            break
+        listings = {doc['_id']: doc for doc in listings_collection.find({'_id': {'$in': [doc['_id'] for doc in batch]}})}
+        operations = []
+        for doc in batch:
+            listing = listings.get(doc['_id'])
+            if listing is None:
+                continue
+            latest, previous = doc['recent'][0], (doc['recent'][1:] or [{}])[0]
+            operations.append(ReplaceOne({'_id': doc['_id']}, {
+                **{field: listing.get(field) for field in LISTING_FIELDS},
+                'search_terms': listing.get('search_terms', []),
+                'price_num': latest['v'],
+                'date_str': latest['k'],
+                'timestamp': listing.get('last_seen'),
+                'prev_price_num': previous.get('v'),
+                'prev_date_str': previous.get('k'),
+            }, upsert=True))
+        if operations:
+            latest_listings_collection.bulk_write(operations, ordered=False)
+        refreshed += len(operations)
+    print(f"Refreshed {refreshed} listings in {latest_listings_collection.name}.")
+    print(f"Registered {search_term_registry.backfill()} search terms.")
+    return refreshed
+
+def migrate_storage(source=None, batch_size=None):
+    """
+    Copies the legacy daily snapshots into listings and price_history, one listing at a time,
+    then rebuilds latest_listings. Safe to re-run: prices are set per date and existing listings
+    keep their attributes.
+    """
+    source = cars_collection if source is None else source
+    batch_size = batch_size or mongo_bulk_batch_size
+    print("Storage before migration:")
+    before = print_storage('before', [source])
 
-@app.route('/download/<filename>')
-def download(filename):
-    return send_file(filename, as_attachment=True)
+    pipeline = [
+        {"$sort": {"timestamp": 1}},
+        {"$group": {
+            "_id": "$unique_id",
+            "latest": {"$last": "$$ROOT"},
+            "first_seen": {"$min": "$timestamp"},
+            "search_terms": {"$addToSet": "$search_term"},
+            "prices": {"$push": {"k": "$date_str", "v": "$price_num"}},
+        }},
+    ]
+    listing_ops, price_ops, migrated = [], [], 0
+    for doc in source.aggregate(pipeline, allowDiskUse=True):
+        if not doc['_id']:
+            continue
+        latest = doc['latest']
+        # Snapshots are sorted by timestamp, so the last price of a date wins
+        prices = {snap['k']: snap['v'] for snap in doc['prices'] if snap.get('k')}
+        listing_ops.append(UpdateOne(
+            {'_id': doc['_id']},
+            # Listings that already exist were scraped after the legacy data and keep their attributes
+            {'$setOnInsert': {field: latest.get(field) for field in LISTING_FIELDS},
+             '$max': {'last_seen': latest['timestamp']},
+             '$min': {'first_seen': doc['first_seen']},
+             '$addToSet': {'search_terms': {'$each': doc['search_terms']}}},
+            upsert=True
+        ))
+        price_ops.append(UpdateOne(
+            {'_id': doc['_id']}, {'$set': {f'prices.{date}': price for date, price in prices.items()}}, upsert=True
+        ))
+        migrated += 1
+        if len(listing_ops) >= batch_size:
+            listings_collection.bulk_write(listing_ops, ordered=False)
+            price_history_collection.bulk_write(price_ops, ordered=False)
+            listing_ops, price_ops = [], []
+            print(f"  {migrated} listings migrated")
+    if listing_ops:
+        listings_collection.bulk_write(listing_ops, ordered=False)
+        price_history_collection.bulk_write(price_ops, ordered=False)
+    print(f"Migrated {migrated} listings from {source.name}.")
+    refresh_latest_listings()
+    ensure_indexes()
+
+    print("Storage after migration:")
+    after = print_storage('after', [listings_collection, price_history_collection, latest_listings_collection])
+    if before and after:
+        print(f"Storage + indexes: {before} -> {after} bytes ({after / before:.1%})")
+    print(f"The {source.name} collection is no longer written to; drop it once the migration is verified.")
+
+def reinit_after_fork(worker_count=1):
+    """
+    Rebuilds the per-process state a forked server worker must not share with its parent: the
+    Mongo client and its collections, the job pool and the response cache connection. Then it
+    redirects stdout into the web logger, as main() does, and starts the worker's background
+    tasks. The scraper's per-host rate is split across worker_count processes, so all of them
+    together keep to the configured rate.
+    """
+    global mongo_client, mongo_db, mongo_health, job_manager, rate_limiter
+    mongo_client = create_mongo_client()
+    mongo_db = mongo_client[mongo_db_name]
+    for name in MONGO_COLLECTION_GLOBALS:
+        globals()[name] = mongo_db[globals()[name].name]
+    search_term_registry.collection = search_terms_collection
+    search_term_registry.invalidate()
+
+    mongo_health.stop()
+    mongo_health = MongoHealthCheck(mongo_client, mongo_health_interval, mongo_health_timeout)
+    sys.stdout = web_logger
+    start_background_tasks()
+    job_manager = ScrapeJobManager(scrape_job_workers, scrape_job_history)
+    if http_cache is not None:
+        http_cache.reopen()
+
+    share = max(1, worker_count)
+    rate_limiter = AdaptiveRateLimiter(scraper_requests_per_second / share, scraper_min_requests_per_second / share,
+                                       scraper_max_requests_per_second / share, scraper_burst, scraper_target_latency)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mercado Libre scraper")
+    subcommands = parser.add_subparsers(dest='command')
+    subcommands.add_parser('serve', help="Run the web application (default)")
+    subcommands.add_parser('ensure-indexes', help="Create the MongoDB indexes and exit")
+    subcommands.add_parser('index-report', help="Show index usage and query plans for every query shape")
+    subcommands.add_parser('migrate-storage', help="Copy the legacy cars snapshots into listings and price_history")
+    subcommands.add_parser('refresh-latest', help="Rebuild latest_listings from listings and price_history")
+    cache_parser = subcommands.add_parser('http-cache', help="Inspect or clean the on-disk response cache")
+    cache_parser.add_argument('action', choices=['stats', 'prune', 'clear'])
+    args = parser.parse_args()
+
+    if args.command in ('ensure-indexes', 'index-report', 'migrate-storage', 'refresh-latest', 'http-cache'):
+        if args.command == 'ensure-indexes':
+            ensure_indexes()
+        elif args.command == 'index-report':
+            index_report()
+        elif args.command == 'migrate-storage':
+            migrate_storage()
+        elif args.command == 'refresh-latest':
+            refresh_latest_listings()
+        elif http_cache is None:
+            print("The response cache is disabled; set HTTP_CACHE_PATH to enable it.")
+        elif args.action == 'prune':
+            print(f"Removed {http_cache.prune()} entries")
+        elif args.action == 'clear':
+            http_cache.clear()
+            print("Response cache cleared")
+        else:
+            for key, value in http_cache.stats().items():
+                print(f"{key:>16}: {value}")
+        return
+    # Redirect stdout to web_logger to capture legacy print statements or 3rd party logs,
+    # although we prefer using web_logger.write() explicitly for application logging.
+    # Only the web app does this, so importing the module and the CLI print to the terminal.
+    sys.stdout = web_logger
+    start_background_tasks()
+    app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=False)
 
 if __name__ == "__main__":
-    app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=False)
+    main()
@@ -0,0 +1,40 @@
+document.getElementById('searchForm').addEventListener('submit', function(event) {
+    const action = event.submitter ? event.submitter.value : 'scrape';
+    if (action === 'history') {
+        return;
+    }
+    event.preventDefault();
+    const form = new FormData(this);
+    form.set('action', action);
+    const status = document.getElementById('jobStatus');
+    const params = new URLSearchParams({ exchange_rate: form.get('exchange_rate') || '', target_currency: form.get('target_currency') || 'USD' });
+    fetch('/jobs', { method: 'POST', body: form })
+        .then(response => response.json().then(job => ({ ok: response.ok, job })))
+        .then(({ ok, job }) => {
+            if (!ok) {
+                status.classList.remove('d-none');
+                status.textContent = job.error;
+                return;
+            }
+            const logSource = new EventSource(`/jobs/${job.job_id}/logs`);
+            logSource.onmessage = e => { status.dataset.lastLog = e.data; };
+            logSource.addEventListener('end', () => logSource.close());
+            pollJob(job.job_id, params, status);
+        });
+});
+function pollJob(jobId, params, status) {
+    fetch('/jobs/' + jobId)
+        .then(response => response.json())
+        .then(job => {
+            status.classList.remove('d-none');
+            status.textContent = `Scrapeando ${job.search_terms.join(', ')}: ${job.pages_done} páginas, ${job.items_found} ítems (${job.elapsed_seconds}s)`
+                + (status.dataset.lastLog ? ` — ${status.dataset.lastLog}` : '');
+            if (job.status === 'done') {
+                window.location = `/jobs/${jobId}/results?${params}`;
+            } else if (job.status === 'failed') {
+                status.textContent = `Error en el scrape: ${job.error}`;
+            } else {
+                setTimeout(() => pollJob(jobId, params, status), 1000);
+            }
+        });
+}
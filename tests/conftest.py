@@ -0,0 +1,12 @@
+import os
+import sys
+
+# main connects lazily, but its background health check and index build must not reach for a server
+os.environ.setdefault("MONGO_HOST", "127.0.0.9")
+os.environ.setdefault("MONGO_HEALTH_INTERVAL", "0")
+os.environ.setdefault("MONGO_ENSURE_INDEXES", "False")
+os.environ.setdefault("HTTP_CACHE_PATH", "")
+os.environ.setdefault("METRICS_ENABLED", "False")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import main  # noqa: E402
@@ -0,0 +1,36 @@
+"""DataTables server-side endpoint over a cached result frame."""
+import pandas as pd
+import pytest
+
+import main
+
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+
+@pytest.fixture
+def result_id():
+    df = pd.DataFrame({'unique_id': [str(i) for i in range(5)], 'description': [f"auto {i}" for i in range(5)],
+                       'price_num': [20000 + i for i in range(5)], 'normalized_price': [20000 + i for i in range(5)]})
+    return main.results_cache.put(df)
+
+
+def test_pages_rows(client, result_id):
+    body = client.get('/api/results', query_string={'result_id': result_id, 'draw': 3, 'start': 1, 'length': 2}).json
+    assert body['draw'] == 3
+    assert body['recordsTotal'] == 5
+    assert [row['unique_id'] for row in body['data']] == ['1', '2']
+
+
+@pytest.mark.parametrize('argument', ['draw', 'start', 'length'])
+def test_non_numeric_arguments_fall_back_to_defaults(client, result_id, argument):
+    response = client.get('/api/results', query_string={'result_id': result_id, argument: 'abc'})
+    assert response.status_code == 200
+    assert response.json['recordsTotal'] == 5
+
+
+def test_expired_result_is_a_datatables_error(client):
+    body = client.get('/api/results', query_string={'result_id': 'f' * 32, 'draw': 'x'}).json
+    assert body['draw'] == 0 and body['data'] == [] and 'error' in body
@@ -0,0 +1,67 @@
+"""convert_prices against the scalar per-row conversion it replaced."""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import main
+
+PRICES = [0, 1, 999.5, 15000, 1000000, 1000001, 15000000, 27500000.4, float('nan')]
+
+
+def scalar_convert(price_num, exchange_rate_val, target_currency):
+    """The former df.iterrows() loop of index(), for one price."""
+    src_curr, _ = main.determine_currency_and_format(price_num)
+    final_price_val = price_num
+    final_curr = src_curr
+    if exchange_rate_val > 0:
+        if target_currency == 'USD' and src_curr == 'ARS':
+            final_price_val = price_num / exchange_rate_val
+            final_curr = 'USD'
+        elif target_currency == 'ARS' and src_curr == 'USD':
+            final_price_val = price_num * exchange_rate_val
+            final_curr = 'ARS'
+    formatted_num = f"{final_price_val:,.0f}".replace(',', '.')
+    p_fmt = f"$ {formatted_num}" if final_curr == 'ARS' else f"US$ {formatted_num}"
+    return final_curr, p_fmt, final_price_val
+
+
+def assert_same_price(actual, expected):
+    if isinstance(expected, float) and math.isnan(expected):
+        assert math.isnan(actual)
+    else:
+        assert actual == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('target_currency', ['USD', 'ARS'])
+@pytest.mark.parametrize('exchange_rate_val', [0, 1000, 1234.5])
+def test_matches_scalar_conversion(exchange_rate_val, target_currency):
+    currency, formatted, normalized = main.convert_prices(pd.Series(PRICES), exchange_rate_val, target_currency)
+    for i, price in enumerate(PRICES):
+        expected_currency, expected_formatted, expected_normalized = scalar_convert(price, exchange_rate_val, target_currency)
+        assert currency[i] == expected_currency
+        assert formatted[i] == expected_formatted
+        assert_same_price(normalized[i], expected_normalized)
+
+
+@pytest.mark.parametrize('dtype', [float, object, 'int64'])
+@pytest.mark.parametrize('target_currency', ['USD', 'ARS'])
+@pytest.mark.parametrize('exchange_rate_val', [0, 1000])
+def test_empty_column(dtype, exchange_rate_val, target_currency):
+    currency, formatted, normalized = main.convert_prices(pd.Series([], dtype=dtype), exchange_rate_val, target_currency)
+    assert len(currency) == len(formatted) == len(normalized) == 0
+
+
+def test_integer_column():
+    prices = [0, 20000, 15000000]
+    currency, formatted, normalized = main.convert_prices(pd.Series(prices, dtype='int64'), 1000, 'ARS')
+    assert list(currency) == [scalar_convert(p, 1000, 'ARS')[0] for p in prices]
+    assert list(formatted) == [scalar_convert(p, 1000, 'ARS')[1] for p in prices]
+    assert np.allclose(normalized, [scalar_convert(p, 1000, 'ARS')[2] for p in prices])
+
+
+def test_render_results_with_no_rows():
+    with main.app.test_request_context('/', method='POST'):
+        html = main.render_results(pd.DataFrame(), 'sin resultados', '1000', 'USD', [])
+    assert 'sin resultados' in html
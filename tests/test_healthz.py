@@ -0,0 +1,46 @@
+"""/healthz reports a MongoDB check no older than the configured interval."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import main
+
+
+class PingCounter:
+    """Stands in for MongoClient; every admin.command('ping') succeeds and is counted."""
+    def __init__(self):
+        self.pings = 0
+        self.admin = self
+
+    def command(self, name):
+        self.pings += 1
+        return {'ok': 1}
+
+
+@pytest.fixture
+def health(monkeypatch):
+    def make(interval):
+        check = main.MongoHealthCheck(PingCounter(), interval, timeout=2)
+        monkeypatch.setattr(main, 'mongo_health', check)
+        return check
+    return make
+
+
+def test_pings_on_every_request_without_background_checks(health):
+    check = health(0)
+    client = main.app.test_client()
+    assert client.get('/healthz').status_code == 200
+    assert client.get('/healthz').status_code == 200
+    assert check.client.pings == 2
+
+
+def test_reuses_a_recent_check_and_refreshes_an_old_one(health):
+    check = health(30)
+    client = main.app.test_client()
+    client.get('/healthz')
+    client.get('/healthz')
+    assert check.client.pings == 1
+
+    check.checked_at = datetime.utcnow() - timedelta(minutes=5)
+    client.get('/healthz')
+    assert check.client.pings == 2
@@ -0,0 +1,92 @@
+"""Both parser backends must turn the same listing page into the same items."""
+import os
+import sys
+
+import pytest
+
+import main
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+import standin  # noqa: E402
+
+pytestmark = pytest.mark.skipif('lxml' not in main.PARSER_BACKENDS, reason="lxml is not installed")
+
+SEARCH_TERM = 'bmw x3'
+# Every page-level field except 'body', a debugging excerpt each backend serializes its own way
+PAGE_FIELDS = ['no_results', 'selector', 'next_url', 'total_results']
+
+
+def wrapper_page():
+    """The older layout: cards wrapped in div.ui-search-result__wrapper."""
+    cards = "".join(
+        '<div class="ui-search-result__wrapper">'
+        f'<a class="poly-component__title" href="https://auto.mercadolibre.com.ar/MLA-{900 + i}-bmw-_JM">BMW X3 {i}</a>'
+        f'<img class="poly-component__picture" src="https://http2.mlstatic.com/{i}.webp">'
+        f'<span class="andes-money-amount__fraction">{25 + i}.000</span>'
+        '<ul><li class="poly-attributes_list__item">2018</li><li class="poly-attributes_list__item">80.000 Km</li></ul>'
+        '<span class="poly-component__location">Rosario</span></div>'
+        for i in range(3))
+    return (f'<html><body><span class="ui-search-search-result__quantity-results">3 resultados</span>{cards}'
+            '<li class="andes-pagination__button andes-pagination__button--next">'
+            '<a href="https://listado.mercadolibre.com.ar/bmw_Desde_49">Siguiente</a></li></body></html>')
+
+
+def malformed_page():
+    """Unclosed elements, stray end tags, entities and missing fields, as saved pages sometimes have."""
+    return (
+        '<html><body><ol>'
+        '<li><div class="poly-card andes-card"><a class="poly-component__title" '
+        'href="https://auto.mercadolibre.com.ar/MLA-111-x3-_JM">BMW &amp; Co X3</a>'
+        '<span class="andes-money-amount__fraction">31.500</span></span></span>'
+        '<ul><li class="poly-attributes_list__item">2019<li class="poly-attributes_list__item">12.000 Km</ul>'
+        '<span class="poly-component__location">C&oacute;rdoba</div>'
+        '<li><div class="poly-card andes-card"><a class="poly-component__title" '
+        'href="https://auto.mercadolibre.com.ar/MLA-222-x3-_JM">Sin precio'
+        '<img class="poly-component__picture" src="data:image/gif;base64,R0lGOD" data-original="https://img/2.webp">'
+        '</div></li>'
+        '<li><div class="poly-card andes-card"><a class="poly-component__title" href="/sin-id">Sin id</a></div>'
+        '</ol><a title="Siguiente" href="https://listado.mercadolibre.com.ar/bmw_Desde_49">&gt;</a>'
+    )
+
+
+PAGES = {
+    'poly-card': standin.generated_pages(60, SEARCH_TERM)[0],
+    'poly-card-last': standin.generated_pages(60, SEARCH_TERM)[1],
+    'wrapper': wrapper_page(),
+    'malformed': malformed_page(),
+    'no-results': standin.StandInServer.NO_RESULTS.decode('utf-8'),
+    'no-cards': '<html><body><p>Nada por aquí</p></body></html>',
+    'empty': '',
+    'whitespace': '  \n',
+}
+
+
+def items(page):
+    built = (main.build_item(card, SEARCH_TERM) for card in page['cards'])
+    return [item for item in built if item]
+
+
+@pytest.mark.parametrize('name', PAGES)
+def test_backends_agree(name):
+    bs4_page = main.extract_cards_bs4(PAGES[name])
+    lxml_page = main.extract_cards_lxml(PAGES[name])
+    assert {field: lxml_page[field] for field in PAGE_FIELDS} == {field: bs4_page[field] for field in PAGE_FIELDS}
+    assert lxml_page['cards'] == bs4_page['cards']
+    assert items(lxml_page) == items(bs4_page)
+
+
+def test_pages_exercise_every_path():
+    bs4_pages = {name: main.extract_cards_bs4(html) for name, html in PAGES.items()}
+    assert bs4_pages['wrapper']['selector'] == 'ui-search-result__wrapper'
+    assert bs4_pages['poly-card']['selector'] == 'poly-card'
+    assert len(items(bs4_pages['poly-card'])) == main.ITEMS_PER_PAGE
+    assert bs4_pages['no-results']['no_results']
+    assert len(items(bs4_pages['malformed'])) == 2
+    for name in ('no-cards', 'empty', 'whitespace'):
+        assert bs4_pages[name]['cards'] == []
+
+
+@pytest.mark.parametrize('backend', ['bs4', 'lxml'])
+@pytest.mark.parametrize('name', ['no-results', 'no-cards', 'empty'])
+def test_parse_results_page_stops_on_empty_pages(backend, name):
+    assert main.parse_results_page(PAGES[name], SEARCH_TERM, backend=backend) is None
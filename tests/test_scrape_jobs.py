@@ -0,0 +1,92 @@
+"""Scrape jobs are claimed and cancelled through scrape_jobs, across worker processes."""
+import asyncio
+import threading
+
+import mongomock
+import pandas as pd
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def scrape_jobs(monkeypatch):
+    collection = mongomock.MongoClient()['test']['scrape_jobs']
+    monkeypatch.setattr(main, 'scrape_jobs_collection', collection)
+    return collection
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Holds every scrape until set."""
+    gate = threading.Event()
+
+    def scrape(search_term, incremental=False):
+        gate.wait(5)
+        return pd.DataFrame()
+    monkeypatch.setattr(main, 'scrape_mercado_libre', scrape)
+    return gate
+
+
+@pytest.fixture
+def managers(gate):
+    """Two managers standing for the job pools of two worker processes."""
+    managers = main.ScrapeJobManager(1, 10), main.ScrapeJobManager(1, 10)
+    yield managers
+    # Their jobs must finish while scrape_jobs is still the test collection
+    gate.set()
+    for manager in managers:
+        manager._executor.shutdown(wait=True)
+
+
+def test_worker_processes_share_a_running_scrape(managers, gate):
+    first, second = managers
+    job, deduplicated = first.submit('scrape', ['bmw'])
+    assert not deduplicated
+
+    same, deduplicated = second.submit('scrape', ['bmw'])
+    assert deduplicated and same.id == job.id
+    other, deduplicated = second.submit('scrape', ['audi'])
+    assert not deduplicated
+
+    gate.set()
+    first._executor.shutdown(wait=True)
+    again, deduplicated = second.submit('scrape', ['bmw'])
+    assert not deduplicated and again.id != job.id
+
+
+def test_expired_claim_is_taken_over(scrape_jobs, managers):
+    first, second = managers
+    job, _ = first.submit('scrape', ['bmw'])
+    scrape_jobs.update_one({'_id': job.claim_id}, {'$set': {'expires_at': job.created_at}})
+
+    taken_over, deduplicated = second.submit('scrape', ['bmw'])
+    assert not deduplicated and taken_over.id != job.id
+
+
+def test_engine_stops_terms_cancelled_elsewhere(monkeypatch):
+    pytest.importorskip('httpx')
+    monkeypatch.setattr(main.AsyncScrapeEngine, 'CANCEL_POLL_INTERVAL', 0.05)
+
+    async def scrape_term(self, client, search_term):
+        if search_term == 'bmw':
+            # Cancelled from "another process" once the engine is running
+            await asyncio.to_thread(main.request_cancellation, search_term)
+            await asyncio.sleep(5)
+        return pd.DataFrame({'search_term': [search_term]})
+    monkeypatch.setattr(main.AsyncScrapeEngine, '_scrape_term', scrape_term)
+
+    assert list(main.AsyncScrapeEngine().run(['bmw', 'audi'])) == ['audi']
+
+
+@pytest.mark.parametrize('body', [None, 'search_term=bmw', '{}', '{"search_term": ""}'])
+def test_cancel_requires_a_search_term(body):
+    response = main.app.test_client().post('/scrape_all/cancel', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert response.json == {'error': 'search_term is required'}
+
+
+def test_cancel_is_recorded_for_other_workers(scrape_jobs):
+    response = main.app.test_client().post('/scrape_all/cancel', json={'search_term': 'bmw'})
+    assert response.json == {'search_term': 'bmw', 'cancelled': False}
+    assert scrape_jobs.find_one({'_id': 'cancel:bmw'})['search_term'] == 'bmw'
@@ -0,0 +1,100 @@
+"""Listings shared by overlapping terms in one "Scrapear Todos" run are parsed and written once."""
+import contextvars
+import os
+import sys
+import threading
+
+import pandas as pd
+import pytest
+
+import main
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+import standin  # noqa: E402
+
+PAGE = standin.generated_pages(main.ITEMS_PER_PAGE, 'bmw')[0]
+
+
+@pytest.fixture
+def seen():
+    seen = main.SeenListings()
+    token = main.seen_listings.set(seen)
+    yield seen
+    main.seen_listings.reset(token)
+
+
+@pytest.fixture
+def collections():
+    db = standin.BulkWriteDatabase('test')
+    return {'listings': db['listings'], 'price_history': db['price_history'], 'latest': db['latest_listings']}
+
+
+@pytest.mark.parametrize('backend', sorted(main.PARSER_BACKENDS))
+def test_repeated_cards_are_not_extracted_again(seen, backend):
+    first = main.parse_results_page(PAGE, 'bmw', backend=backend)['items']
+    page = main.PARSER_BACKENDS[backend](PAGE, seen.is_parsed)
+    assert all(card.get('skipped') for card in page['cards'])
+
+    second = main.parse_results_page(PAGE, 'bmw x3', backend=backend)['items']
+    assert second == [{**item, 'search_term': 'bmw x3'} for item in first]
+    assert seen.summary()['cards_reused'] == main.ITEMS_PER_PAGE
+
+
+def test_changed_price_is_parsed_again(seen):
+    main.parse_results_page(PAGE, 'bmw')
+    repriced = PAGE.replace('andes-money-amount__fraction">', 'andes-money-amount__fraction">9', 1)
+    items = main.parse_results_page(repriced, 'bmw x3')['items']
+    assert seen.summary()['cards_reused'] == main.ITEMS_PER_PAGE - 1
+    assert items[0]['price_num'] != main.parse_results_page(PAGE, 'bmw x3')['items'][0]['price_num']
+
+
+def save_concurrently(terms, df, collections, batch_size):
+    """Saves df under every term at once, each from its own thread, like the asyncio engine does."""
+    barrier = threading.Barrier(len(terms))
+    results = {}
+
+    def save(term):
+        barrier.wait()
+        results[term] = main.save_listings(df.assign(search_term=term), term, batch_size=batch_size, **collections)
+
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(save, term)) for term in terms]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize('batch_size', [7, 500])
+def test_concurrent_terms_write_each_listing_once(seen, collections, batch_size):
+    df = pd.DataFrame(main.parse_results_page(PAGE, 'bmw')['items'])
+    terms = ['bmw', 'bmw x3', 'bmw x3 2018']
+    save_concurrently(terms, df, collections, batch_size)
+
+    # Every listing is fully written by one term and only gets the term added by the others
+    assert seen.summary()['membership_only_writes'] == len(df) * (len(terms) - 1)
+    for collection in (collections['listings'], collections['latest']):
+        assert collection.count_documents({}) == len(df)
+        for term in terms:
+            assert collection.count_documents({'search_terms': term}) == len(df)
+    assert collections['price_history'].count_documents({}) == len(df)
+
+
+def test_failed_write_is_not_treated_as_stored(seen):
+    records = [{'unique_id': '1', 'price_num': 100}, {'unique_id': '2', 'price_num': 200}]
+    write, stored, waiting, done = seen.claim(records)
+    assert (len(write), stored, waiting) == (2, [], [])
+
+    write_again, _, waiting, _ = seen.claim(records)
+    assert write_again == [] and [event for _, event in waiting] == [done, done]
+
+    seen.release(write, done, written=False)
+    write, stored, waiting, _ = seen.claim(records)
+    assert (len(write), stored, waiting) == (2, [], [])
+
+
+def test_saves_outside_a_run_write_everything(collections):
+    df = pd.DataFrame(main.parse_results_page(PAGE, 'bmw')['items'])
+    main.save_listings(df, 'bmw', **collections)
+    stats = main.save_listings(df.assign(search_term='bmw x3'), 'bmw x3', **collections)
+    assert stats[0]['operations'] == 3 * len(df)